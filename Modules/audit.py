@@ -0,0 +1,189 @@
+"""
+audit.py - Append-only audit log of gated command invocations
+
+Copyright (c) 2018 The Fuel Rats Mischief,
+All rights reserved.
+
+Licensed under the BSD 3-Clause License.
+
+See LICENSE.md
+
+This module is built on top of the Pydle system.
+
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+from Modules.metrics import Metrics
+import config
+
+log = logging.getLogger(f"{config.Logging.base_logger}.audit")
+
+
+class AuditLog(object):
+    """
+    Buffers audit records in memory and writes them as JSON lines from a background thread
+
+    `record()` only appends to a list, serialization and disk I/O happen on the writer thread,
+    which flushes every `flush_interval` seconds (or as soon as `batch_size` records are waiting),
+    fsyncs at most every `fsync_interval` seconds and rotates the file once it exceeds
+    `max_bytes`, keeping `backups` old files around as `<path>.1`, `<path>.2`, ...
+
+    Records that couldn't be written are retried with the next flush. If writing keeps failing,
+    no more than `max_records` are kept, dropping the oldest and counting them as `audit.dropped`.
+    """
+
+    def __init__(self, path: str, batch_size: int = None, flush_interval: float = None,
+                 fsync_interval: float = None, max_bytes: int = None, backups: int = None,
+                 max_records: int = None):
+        """
+        All parameters but `path` default to their `config.Audit` counterparts.
+        :param path: file to write to
+        :param batch_size: number of waiting records that triggers an early flush
+        :param flush_interval: seconds between flushes
+        :param fsync_interval: minimum seconds between fsyncs
+        :param max_bytes: size at which the file is rotated
+        :param backups: number of rotated files to keep
+        :param max_records: number of waiting records kept at most
+        """
+        self.path = path
+        self.batch_size = batch_size or config.Audit.batch_size
+        self.flush_interval = flush_interval or config.Audit.flush_interval
+        self.fsync_interval = fsync_interval if fsync_interval is not None \
+            else config.Audit.fsync_interval
+        self.max_bytes = max_bytes or config.Audit.max_bytes
+        self.backups = backups if backups is not None else config.Audit.backups
+        self.max_records = max_records or config.Audit.max_records
+
+        self._records = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._file = None
+        self._last_fsync = 0.0
+
+    def record(self, **fields) -> None:
+        """
+        Queue an audit record. Cheap enough to call on every command.
+        :param fields: JSON serializable values describing what happened
+        """
+        fields["time"] = time.time()
+        with self._lock:
+            self._records.append(fields)
+            waiting = len(self._records)
+            dropped = waiting - self.max_records
+            if dropped > 0:
+                # writing keeps failing, don't let the backlog eat all memory
+                del self._records[:dropped]
+        if dropped > 0:
+            Metrics.increment("audit.dropped", dropped)
+        if waiting >= self.batch_size:
+            self._wakeup.set()
+
+    def start(self) -> None:
+        """Start the writer thread."""
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the writer thread, writing and syncing everything still waiting."""
+        if self._thread is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stopping:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._flush_logged()
+        self._flush_logged(sync=True)
+        self._close()
+
+    def _flush_logged(self, sync: bool = False) -> None:
+        """`flush()`, logging instead of raising if the file can't be written."""
+        try:
+            self.flush(sync)
+        except OSError as ex:
+            log.error(f"unable to write audit log {self.path}: {ex!r}")
+
+    def flush(self, sync: bool = False) -> int:
+        """
+        Write all waiting records
+        :param sync: fsync regardless of when the last fsync happened
+        :return: number of records written
+        :raises OSError: the records couldn't be written, they are kept for the next flush
+        """
+        with self._lock:
+            records, self._records = self._records, []
+        if not records:
+            return 0
+
+        data = "".join(json.dumps(record, separators=(",", ":"), default=str) + "\n"
+                       for record in records).encode("utf-8")
+        try:
+            if self._file is None:
+                self._open()
+            elif self._file.tell() + len(data) > self.max_bytes:
+                self._rotate()
+            self._file.write(data)
+            self._file.flush()
+        except OSError:
+            # keep them for the next flush, ahead of anything recorded meanwhile
+            with self._lock:
+                self._records[:0] = records
+            raise
+
+        now = time.monotonic()
+        if sync or now - self._last_fsync >= self.fsync_interval:
+            os.fsync(self._file.fileno())
+            self._last_fsync = now
+        return len(records)
+
+    def _open(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, "ab")
+
+    def _close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _rotate(self) -> None:
+        """Move `<path>` to `<path>.1` (shifting older files up) and start a new file."""
+        os.fsync(self._file.fileno())
+        self._close()
+        if self.backups > 0:
+            for index in range(self.backups - 1, 0, -1):
+                source = f"{self.path}.{index}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.path}.{index + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+
+####
+# the audit log in use, `None` disables auditing
+sink = None
+
+
+def record(**fields) -> None:
+    """
+    Queue an audit record on the active audit log, if there is one
+    :param fields: JSON serializable values describing what happened
+    """
+    if sink is not None:
+        sink.record(**fields)
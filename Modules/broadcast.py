@@ -0,0 +1,131 @@
+"""
+broadcast.py - Sending the same message to several targets at once
+
+Copyright (c) 2018 The Fuel Rats Mischief,
+All rights reserved.
+
+Licensed under the BSD 3-Clause License.
+
+See LICENSE.md
+
+This module is built on top of the Pydle system.
+
+"""
+import asyncio
+import logging
+import math
+
+import pydle
+
+from Modules.metrics import Metrics
+from Modules.reply_buffer import ReplyBuffer
+from Modules.user_index import casefold
+import config
+
+log = logging.getLogger(f"{config.Logging.base_logger}.broadcast")
+
+####
+# broadcasts currently being sent: (bot, message, folded targets) -> task sending it
+_pending = {}
+
+
+def parse_targmax(value: str) -> dict:
+    """
+    Parse an ISUPPORT TARGMAX value, e.g. `PRIVMSG:4,NOTICE:4,JOIN:`
+
+    pydle drops commands without a limit, which per the spec have no limit at all rather than an
+    unknown one, so these are kept here as `math.inf`.
+    :param value: TARGMAX value
+    :return: dict of command -> number of targets
+    """
+    limits = {}
+    for entry in (value or "").split(","):
+        command, _, limit = entry.partition(":")
+        if command:
+            limits[command.upper()] = int(limit) if limit else math.inf
+    return limits
+
+
+def target_limit(bot: pydle.BasicClient) -> int or None:
+    """
+    Number of targets the server accepts in a single PRIVMSG, as advertised by ISUPPORT TARGMAX
+    :param bot: Instance of the bot.
+    :return: the limit, `math.inf` if there is none, None if the server didn't advertise one
+    """
+    return (getattr(bot, "_target_limits", None) or {}).get("PRIVMSG")
+
+
+def _lines(bot: pydle.BasicClient, target: str, message: str) -> list:
+    buffer = ReplyBuffer(bot, target)
+    buffer.add(message)
+    return buffer.lines()
+
+
+def plan(bot: pydle.BasicClient, targets: list, message: str) -> list:
+    """
+    Group targets into as few PRIVMSGs as possible
+
+    Consecutive targets are joined with commas up to the server's TARGMAX, as long as the longer
+    target list doesn't make the message split into more lines than it would for each target on
+    its own. If the server doesn't limit targets only the line length does. Without a TARGMAX
+    every target is sent to separately.
+    :param bot: Instance of the bot.
+    :param targets: channels and/or nicknames
+    :param message: message body
+    :return: list of (target, lines), where target may be a comma separated list
+    """
+    limit = target_limit(bot)
+    groups = []
+    for target in targets:
+        single = _lines(bot, target, message)
+        if groups and limit and len(groups[-1][0]) < limit:
+            batch, batch_lines = groups[-1]
+            joined = _lines(bot, ",".join(batch + [target]), message)
+            if len(joined) <= max(len(batch_lines), len(single)):
+                groups[-1] = (batch + [target], joined)
+                continue
+        groups.append(([target], single))
+    return [(",".join(batch), lines) for batch, lines in groups]
+
+
+async def _send(bot: pydle.BasicClient, targets: list, message: str) -> int:
+    sent = 0
+    for target, lines in plan(bot, targets, message):
+        for line in lines:
+            await bot.message(target, line)
+            sent += 1
+    Metrics.increment("broadcast.lines", sent)
+    return sent
+
+
+async def broadcast(bot: pydle.BasicClient, targets: list, message: str) -> int:
+    """
+    Send a message to several channels and/or nicknames
+
+    Duplicate targets are dropped. If an identical broadcast (same message, same targets) is still
+    being sent, it isn't sent again, this call waits for the pending one instead. A broadcast that
+    has started is finished even if the caller is cancelled.
+    :param bot: Instance of the bot.
+    :param targets: channels and/or nicknames
+    :param message: message body
+    :return: number of lines this call sent, 0 if it was a duplicate
+    """
+    fold = getattr(bot.users, "casefold", casefold)
+    unique = {}
+    for target in targets:
+        unique.setdefault(fold(target), target)
+    if not unique:
+        return 0
+
+    key = (bot, message, frozenset(unique))
+    pending = _pending.get(key)
+    if pending is not None:
+        log.debug(f"not repeating pending broadcast to {', '.join(unique.values())}")
+        Metrics.increment("broadcast.deduplicated")
+        await asyncio.shield(pending)
+        return 0
+
+    task = asyncio.ensure_future(_send(bot, list(unique.values()), message))
+    _pending[key] = task
+    task.add_done_callback(lambda finished: _pending.pop(key, None))
+    return await asyncio.shield(task)
@@ -0,0 +1,193 @@
+"""
+events.py - Handles registration and dispatch of non-command IRC events
+
+Copyright (c) 2018 The Fuel Rats Mischief,
+All rights reserved.
+
+Licensed under the BSD 3-Clause License.
+
+See LICENSE.md
+
+This module is built on top of the Pydle system.
+
+"""
+import asyncio
+from functools import wraps
+import logging
+
+from Modules.metrics import Metrics
+from Modules.user_index import casefold
+from Modules.watchdog import Watchdog
+import config
+
+
+class EventException(Exception):
+    """
+    base Event Exception
+    """
+    pass
+
+
+class UnknownEventException(EventException):
+    """
+    Someone attempted to subscribe to an event type that is never dispatched.
+    """
+    pass
+
+
+class Event(object):
+    """Object to hold information on an IRC event (and where it happened)."""
+
+    def __init__(self, name: str, channel: str = None, nickname: str = None, **details):
+        """
+        :param name: event type, one of `Events.types`
+        :param channel: channel the event happened in, if any
+        :param nickname: nickname of the user the event is about
+        :param details: event specific information (e.g. `message`, `new`, `by`, `reason`)
+        """
+        self.name = name
+        self.channel = channel
+        self.nickname = nickname
+        self.details = details
+
+    def __getattr__(self, item):
+        try:
+            return self.__dict__["details"][item]
+        except KeyError:
+            raise AttributeError(item) from None
+
+
+class Events:
+    """
+    Handles event handler registration and dispatch
+
+    Handlers are indexed by `(event, channel, nickname)` where `None` acts as a wildcard, so
+    dispatching an event only has to look at the four buckets that can possibly match it.
+    """
+
+    ####
+    # logger facility
+    log = logging.getLogger(f"{config.Logging.base_logger}.events")
+    ####
+    # handlers registered with @event will populate this dict
+    _registered_handlers = {}
+
+    ####
+    # event types the bot dispatches
+    types = ("join", "part", "nick", "quit", "kick")
+
+    ####
+    # Pydle bot instance.
+    bot = None
+
+    @staticmethod
+    def _key(name: str or None) -> str or None:
+        """Normalize a channel or nickname filter for index lookups."""
+        return casefold(name) if name is not None else None
+
+    @classmethod
+    def _register(cls, func, name: str, channel: str = None, nickname: str = None) -> bool:
+        """
+        Register a new event handler
+        :param func: handler coroutine function
+        :param name: event type to subscribe to
+        :param channel: only invoke for events in this channel
+        :param nickname: only invoke for events about this nickname
+        :return: success
+        """
+        if func is None or not callable(func):
+            return False
+        if name not in cls.types:
+            raise UnknownEventException(f"unable to subscribe to unknown event {name}")
+
+        key = (name, cls._key(channel), cls._key(nickname))
+        cls._registered_handlers.setdefault(key, []).append(func)
+        return True
+
+    @classmethod
+    def _flush(cls) -> None:
+        """
+        Flushes registered handlers
+        Probably useless outside testing...
+        :return: None
+        """
+        cls._registered_handlers = {}
+
+    @classmethod
+    def event(cls, name: str, channel: str = None, nickname: str = None):
+        """
+        Subscribe the decorated coroutine to an IRC event.
+
+        Handlers are called as `handler(bot, event)`.
+        :param name: event type, one of `Events.types`
+        :param channel: optional channel filter
+        :param nickname: optional nickname filter
+        """
+
+        def real_decorator(func):
+            cls.log.debug(f"registering handler {func.__name__} for {name} "
+                          f"(channel={channel}, nickname={nickname})")
+
+            @wraps(func)
+            async def wrapper(bot, event):
+                return await func(bot, event)
+
+            if not cls._register(wrapper, name, channel, nickname):
+                raise EventException("unable to register event handler.")
+            return wrapper
+        return real_decorator
+
+    @classmethod
+    def get_handlers(cls, name: str, channel: str = None, nickname: str = None) -> list:
+        """
+        Find every handler interested in an event
+        :param name: event type
+        :param channel: channel the event happened in
+        :param nickname: nickname the event is about
+        :return: list of handlers
+        """
+        channel = cls._key(channel)
+        nickname = cls._key(nickname)
+
+        keys = {(name, None, None), (name, channel, None), (name, None, nickname),
+                (name, channel, nickname)}
+        handlers = []
+        for key in keys:
+            handlers.extend(cls._registered_handlers.get(key, ()))
+        return handlers
+
+    @classmethod
+    async def _invoke(cls, handler, event: Event):
+        """Run a single handler, recording how long it took."""
+        name = f"event.{event.name}.{handler.__name__}"
+        with Watchdog.activity(name), Metrics.timer(name):
+            return await handler(cls.bot, event)
+
+    @classmethod
+    async def dispatch(cls, name: str, channel: str = None, nickname: str = None,
+                       **details) -> list:
+        """
+        Dispatch an event to all matching handlers concurrently
+
+        A failing handler is logged and does not affect the others.
+        :param name: event type
+        :param channel: channel the event happened in
+        :param nickname: nickname the event is about
+        :param details: event specific information, see `Event`
+        :return: list of handler results (exceptions in place of failed handlers' results)
+        """
+        if name not in cls.types:
+            raise UnknownEventException(f"unable to dispatch unknown event {name}")
+
+        handlers = cls.get_handlers(name, channel, nickname)
+        if not handlers:
+            return []
+
+        event = Event(name, channel, nickname, **details)
+        cls.log.debug(f"dispatching {name} to {len(handlers)} handler(s)")
+        results = await asyncio.gather(*(cls._invoke(handler, event) for handler in handlers),
+                                       return_exceptions=True)
+        for handler, result in zip(handlers, results):
+            if isinstance(result, Exception):
+                cls.log.error(f"handler {handler.__name__} for {name} raised {result!r}")
+        return results
@@ -0,0 +1,226 @@
+"""
+facts.py - Canned fact replies backed by SQLite
+
+Copyright (c) 2018 The Fuel Rats Mischief,
+All rights reserved.
+
+Licensed under the BSD 3-Clause License.
+
+See LICENSE.md
+
+This module is built on top of the Pydle system.
+
+"""
+import asyncio
+from bisect import bisect_left
+import logging
+import re
+import sqlite3
+
+from Modules.rat_command import Commands, NameCollisionException
+import config
+
+log = logging.getLogger(f"{config.Logging.base_logger}.facts")
+
+
+####
+# `{name}` placeholder in a fact body. Nothing else is special, so a fact's text can never make
+# rendering fail or reach into the values (as `str.format` allows with `{nick.__class__}`)
+_PLACEHOLDER = re.compile(r"\{(\w+)\}")
+
+
+class Fact(object):
+    """A single fact in a single language. The body is loaded on first use."""
+    __slots__ = ("name", "lang", "mtime", "_body", "_fields")
+
+    def __init__(self, name: str, lang: str, mtime: float):
+        self.name = name
+        self.lang = lang
+        self.mtime = mtime
+        self._body = None
+        self._fields = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._body is not None
+
+    def load(self, body: str) -> None:
+        """
+        Set the body, parsing its placeholders once
+        :param body: fact text, may contain `{nick}`-style placeholders
+        """
+        self._body = body
+        self._fields = frozenset(_PLACEHOLDER.findall(body))
+
+    def render(self, **values) -> str:
+        """
+        Fill in the placeholders
+        :param values: placeholder values, missing ones are left untouched
+        :return: rendered text
+        """
+        if not self._fields:
+            # nothing to fill in, the body is already the final text
+            return self._body
+        return _PLACEHOLDER.sub(lambda match: str(values.get(match.group(1), match.group(0))),
+                                self._body)
+
+
+class FactsDatabase(object):
+    """
+    Facts stored in an SQLite table `facts(name, lang, body, mtime)`
+
+    Names, languages and modification times are loaded eagerly, bodies only when a fact is first
+    used. Facts are indexed by `(name, lang)` and by a sorted list of names for prefix searches.
+    `refresh()` re-reads only names and modification times and drops the bodies of changed facts.
+
+    `register()` makes each fact a command: `!prep` replies in the default language, `!prep-de`
+    in German and `!prep client` addresses the reply to `client`.
+    """
+
+    def __init__(self, path: str, default_language: str = None):
+        """
+        :param path: SQLite database file
+        :param default_language: language used when none is given, defaults to
+            `config.Facts.default_language`
+        """
+        self.path = path
+        self.default_language = default_language or config.Facts.default_language
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS facts (name TEXT NOT NULL, "
+                                 "lang TEXT NOT NULL, body TEXT NOT NULL, mtime REAL NOT NULL, "
+                                 "PRIMARY KEY (name, lang))")
+        # (name, lang) -> Fact
+        self._facts = {}
+        # sorted, unique fact names
+        self._names = []
+        # command aliases currently registered with `Commands`
+        self._registered = set()
+
+    def __len__(self):
+        return len(self._facts)
+
+    def __contains__(self, key) -> bool:
+        return key in self._facts
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def load(self) -> None:
+        """(Re)load all fact names, dropping every cached body."""
+        self._facts = {(name, lang): Fact(name, lang, mtime) for name, lang, mtime in
+                       self._connection.execute("SELECT name, lang, mtime FROM facts")}
+        self._index()
+
+    def _index(self) -> None:
+        self._names = sorted({name for name, lang in self._facts})
+
+    def refresh(self) -> tuple:
+        """
+        Pick up facts that were added, changed or removed since the last load
+        :return: (added, changed, removed) sets of (name, lang) keys
+        """
+        current = {(name, lang): mtime for name, lang, mtime in
+                   self._connection.execute("SELECT name, lang, mtime FROM facts")}
+        added = current.keys() - self._facts.keys()
+        removed = self._facts.keys() - current.keys()
+        changed = {key for key in current.keys() & self._facts.keys()
+                   if current[key] != self._facts[key].mtime}
+
+        for key in removed:
+            del self._facts[key]
+        for key in added | changed:
+            self._facts[key] = Fact(*key, current[key])
+        if added or removed:
+            self._index()
+            if self._registered:
+                self.register()
+        if added or changed or removed:
+            log.info(f"facts refreshed: {len(added)} added, {len(changed)} changed, "
+                     f"{len(removed)} removed")
+        return added, changed, removed
+
+    async def watch(self, interval: float = None) -> None:
+        """
+        Refresh periodically, forever
+        :param interval: seconds between refreshes, defaults to `config.Facts.refresh_interval`
+        """
+        while True:
+            await asyncio.sleep(interval or config.Facts.refresh_interval)
+            try:
+                self.refresh()
+            except sqlite3.Error as ex:
+                log.error(f"unable to refresh facts from {self.path}: {ex!r}")
+
+    def get(self, name: str, lang: str = None) -> Fact or None:
+        """
+        Find a fact, loading its body if needed. Falls back to the default language.
+        :param name: fact name
+        :param lang: language code
+        :return: `Fact` or None
+        """
+        name = name.lower()
+        fact = self._facts.get((name, (lang or self.default_language).lower()))
+        if fact is None and lang:
+            fact = self._facts.get((name, self.default_language))
+        if fact is not None and not fact.loaded:
+            row = self._connection.execute("SELECT body FROM facts WHERE name = ? AND lang = ?",
+                                           (fact.name, fact.lang)).fetchone()
+            if row is None:
+                # removed since the last refresh
+                return None
+            fact.load(row[0])
+        return fact
+
+    def search(self, prefix: str) -> list:
+        """
+        Fact names starting with `prefix`
+        :param prefix: start of the name
+        :return: sorted list of names
+        """
+        prefix = prefix.lower()
+        names = []
+        index = bisect_left(self._names, prefix)
+        while index < len(self._names) and self._names[index].startswith(prefix):
+            names.append(self._names[index])
+            index += 1
+        return names
+
+    def languages(self, name: str) -> list:
+        """Languages a fact is available in."""
+        return sorted(lang for fact_name, lang in self._facts if fact_name == name.lower())
+
+    def aliases(self) -> set:
+        """Command names for all facts, i.e. `name` and `name-lang`."""
+        aliases = set(self._names)
+        aliases.update(f"{name}-{lang}" for name, lang in self._facts)
+        return aliases
+
+    def register(self) -> None:
+        """Register (or update the registration of) all facts as commands."""
+        wanted = self.aliases()
+        Commands._unregister(list(self._registered - wanted))
+        for alias in wanted - self._registered:
+            try:
+                Commands._register(self.invoke, alias)
+            except NameCollisionException:
+                log.warning(f"fact {alias} collides with a command and was not registered")
+                continue
+            self._registered.add(alias)
+        self._registered &= wanted
+
+    async def invoke(self, bot, trigger, words, words_eol):
+        """
+        Command handler shared by all facts
+        """
+        name, separator, lang = words[0].rpartition("-")
+        if not name or (name.lower(), lang.lower()) not in self._facts:
+            name, lang = words[0], None
+        fact = self.get(name, lang)
+        if fact is None:
+            return None
+
+        text = fact.render(nick=trigger.nickname, channel=trigger.channel)
+        if len(words) > 1:
+            text = f"{words_eol[1]}: {text}"
+        await trigger.reply(text)
+        return text
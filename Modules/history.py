@@ -0,0 +1,185 @@
+"""
+history.py - Bounded per-channel and per-nickname message history
+
+Copyright (c) 2018 The Fuel Rats Mischief,
+All rights reserved.
+
+Licensed under the BSD 3-Clause License.
+
+See LICENSE.md
+
+This module is built on top of the Pydle system.
+
+"""
+from collections import namedtuple, OrderedDict
+import time
+
+from Modules.user_index import casefold
+import config
+
+####
+# a single recorded message. Instances are shared between the channel and nickname buffers.
+HistoryLine = namedtuple("HistoryLine", ["timestamp", "channel", "nickname", "message"])
+
+
+class RingBuffer(object):
+    """
+    Fixed capacity buffer overwriting its oldest item once full
+
+    The backing list only grows up to `capacity`, so rarely used buffers stay small.
+    """
+    __slots__ = ("capacity", "_items", "_next")
+
+    def __init__(self, capacity: int):
+        if capacity < 1:
+            raise ValueError(f"capacity must be at least 1, got {capacity}")
+        self.capacity = capacity
+        self._items = []
+        # index the next item will be written to
+        self._next = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        """Iterate from oldest to newest."""
+        if len(self._items) < self.capacity:
+            return iter(self._items)
+        return iter(self._items[self._next:] + self._items[:self._next])
+
+    def append(self, item) -> None:
+        """Add an item, dropping the oldest one if the buffer is full. O(1)"""
+        if len(self._items) < self.capacity:
+            self._items.append(item)
+        else:
+            self._items[self._next] = item
+        self._next = (self._next + 1) % self.capacity
+
+    def newest(self, count: int = None):
+        """
+        Iterate from newest to oldest
+        :param count: maximum number of items, defaults to all of them
+        """
+        size = len(self._items)
+        count = size if count is None else min(count, size)
+        index = self._next
+        for _ in range(count):
+            index = (index - 1) % size
+            yield self._items[index]
+
+
+class History(object):
+    """
+    Message history of the channels the bot is in
+
+    Every channel gets a ring buffer of its most recent lines and every nickname gets a (smaller)
+    ring buffer referencing the same lines, so "last N lines from nick" never scans a channel.
+    Both are additionally capped in number; the least recently active channel or nickname is
+    forgotten first, which bounds memory use to roughly
+    `max_channels * channel_lines + max_nicknames * nickname_lines` lines.
+    """
+
+    def __init__(self, channel_lines: int = None, nickname_lines: int = None,
+                 max_channels: int = None, max_nicknames: int = None):
+        """
+        All parameters default to their `config.History` counterparts.
+        :param channel_lines: lines kept per channel
+        :param nickname_lines: lines kept per nickname
+        :param max_channels: number of channels tracked
+        :param max_nicknames: number of nicknames tracked
+        """
+        self.channel_lines = channel_lines or config.History.channel_lines
+        self.nickname_lines = nickname_lines or config.History.nickname_lines
+        self.max_channels = max_channels or config.History.max_channels
+        self.max_nicknames = max_nicknames or config.History.max_nicknames
+        self._channels = OrderedDict()
+        self._nicknames = OrderedDict()
+
+    @staticmethod
+    def _key(name: str) -> str:
+        """Normalize a channel or nickname for lookups."""
+        return casefold(name)
+
+    @staticmethod
+    def _buffer_for(buffers: OrderedDict, key: str, capacity: int, limit: int) -> RingBuffer:
+        """Fetch (or create) a buffer, marking it as most recently used."""
+        buffer = buffers.get(key)
+        if buffer is None:
+            buffer = buffers[key] = RingBuffer(capacity)
+            if len(buffers) > limit:
+                buffers.popitem(last=False)
+        else:
+            buffers.move_to_end(key)
+        return buffer
+
+    def record(self, channel: str, nickname: str, message: str,
+               timestamp: float = None) -> HistoryLine:
+        """
+        Remember a message
+        :param channel: channel the message was sent in
+        :param nickname: nickname of the sender
+        :param message: message body
+        :param timestamp: when the message was received, defaults to now
+        :return: the recorded line
+        """
+        line = HistoryLine(time.time() if timestamp is None else timestamp, channel, nickname,
+                           message)
+        self._buffer_for(self._channels, self._key(channel), self.channel_lines,
+                         self.max_channels).append(line)
+        self._buffer_for(self._nicknames, self._key(nickname), self.nickname_lines,
+                         self.max_nicknames).append(line)
+        return line
+
+    def last(self, channel: str, count: int = 1) -> list:
+        """
+        Most recent lines in a channel
+        :param channel: channel to look at
+        :param count: maximum number of lines
+        :return: list of `HistoryLine`, newest first
+        """
+        buffer = self._channels.get(self._key(channel))
+        return list(buffer.newest(count)) if buffer is not None else []
+
+    def last_from(self, nickname: str, count: int = 1, channel: str = None) -> list:
+        """
+        Most recent lines sent by a nickname
+        :param nickname: sender to look for
+        :param count: maximum number of lines
+        :param channel: only consider lines sent in this channel
+        :return: list of `HistoryLine`, newest first
+        """
+        buffer = self._nicknames.get(self._key(nickname))
+        if buffer is None:
+            return []
+        if channel is None:
+            return list(buffer.newest(count))
+
+        channel = self._key(channel)
+        lines = []
+        for line in buffer.newest():
+            if self._key(line.channel) == channel:
+                lines.append(line)
+                if len(lines) == count:
+                    break
+        return lines
+
+    def forget(self, nickname: str) -> None:
+        """Drop the per-nickname index of a user. Their lines stay in the channel buffers."""
+        self._nicknames.pop(self._key(nickname), None)
+
+    def lines(self) -> list:
+        """
+        Every line held for any channel, e.g. to record them again into a new `History`
+        :return: list of `HistoryLine`, oldest first
+        """
+        lines = [line for buffer in self._channels.values() for line in buffer]
+        lines.sort(key=lambda line: line.timestamp)
+        return lines
+
+    @property
+    def channel_count(self) -> int:
+        return len(self._channels)
+
+    @property
+    def nickname_count(self) -> int:
+        return len(self._nicknames)
@@ -0,0 +1,293 @@
+"""
+keywords.py - Handles keyword registration and scanning of non-command messages
+
+Copyright (c) 2018 The Fuel Rats Mischief,
+All rights reserved.
+
+Licensed under the BSD 3-Clause License.
+
+See LICENSE.md
+
+This module is built on top of the Pydle system.
+
+"""
+import asyncio
+from functools import wraps
+import logging
+import re
+
+from Modules.trigger import Trigger
+from Modules.watchdog import Watchdog
+import config
+
+####
+# numbered backreference or conditional, these refer to the wrong group once a pattern is combined
+_GROUP_REFERENCE = re.compile(r"(?<!\\)(?:\\\\)*\\[1-9]|\(\?\(\d")
+
+
+class KeywordException(Exception):
+    """
+    base Keyword Exception
+    """
+    pass
+
+
+def _trie_pattern(words: list) -> str:
+    """
+    Build a regular expression matching any of `words`, shaped as a prefix tree
+
+    `re` tries alternatives one after the other, so a flat `a|b|c|...` costs one attempt per word at
+    every position of the scanned text. Factoring out common prefixes means only the branch for
+    the next character is ever tried.
+    :param words: literal words to match
+    :return: pattern source (without groups)
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        ends_here = "" in node
+        if len(branches) == 1 and not ends_here:
+            return branches[0]
+        return f"(?:{'|'.join(branches)}){'?' if ends_here else ''}"
+
+    return build(trie)
+
+
+class Keywords:
+    """
+    Handles keyword handler registration and message scanning
+
+    All registered keywords are compiled into a single pattern, so scanning a message is one regex
+    pass no matter how many keywords are registered. Plain keywords share one prefix-tree shaped
+    group and are told apart by the matched text, regex keywords get a group each. Regex keywords
+    referring to their groups by number are matched on their own instead, as combining shifts the
+    numbers. The combined pattern is rebuilt whenever keywords are registered, so a pattern that
+    still can't be part of it is rejected right away instead of breaking `scan`.
+    """
+
+    ####
+    # logger facility
+    log = logging.getLogger(f"{config.Logging.base_logger}.keywords")
+    ####
+    # lowercase keyword -> (compiled keyword, [handlers])
+    _registered_keywords = {}
+    ####
+    # list of (pattern source, compiled pattern, [handlers]) in registration order
+    _registered_patterns = []
+    ####
+    # combined pattern and the index of its outer groups -> entry in `_registered_patterns`
+    _compiled = None
+    _group_map = {}
+    ####
+    # entries of `_registered_patterns` left out of the combined pattern, see `_GROUP_REFERENCE`
+    _separate_patterns = []
+
+    ####
+    # Pydle bot instance.
+    bot = None
+
+    @classmethod
+    def _register(cls, func, patterns: list, regex: bool = False) -> bool:
+        """
+        Register a new keyword handler
+        :param func: handler coroutine function
+        :param patterns: keywords (or regular expressions, see `regex`) to react to
+        :param regex: treat patterns as regular expressions instead of whole words
+        :return: success
+        :raises KeywordException: a pattern is invalid, nothing is registered then
+        """
+        if func is None or not callable(func):
+            return False
+
+        keywords = {keyword: (compiled, list(handlers))
+                    for keyword, (compiled, handlers) in cls._registered_keywords.items()}
+        registered_patterns = [(source, compiled, list(handlers))
+                               for source, compiled, handlers in cls._registered_patterns]
+        try:
+            cls._add(func, patterns, regex)
+            cls._compile()
+        except (KeywordException, re.error) as ex:
+            cls._registered_keywords = keywords
+            cls._registered_patterns = registered_patterns
+            cls._compile()
+            if isinstance(ex, KeywordException):
+                raise
+            raise KeywordException(f"unable to combine keyword patterns {patterns}: {ex}") from ex
+        return True
+
+    @classmethod
+    def _add(cls, func, patterns: list, regex: bool) -> None:
+        """Add a handler to the registered keywords, see `_register`."""
+        for pattern in patterns:
+            if not regex:
+                keyword = pattern.lower()
+                if keyword not in cls._registered_keywords:
+                    compiled = re.compile(re.escape(keyword), re.IGNORECASE)
+                    cls._registered_keywords[keyword] = (compiled, [])
+                cls._registered_keywords[keyword][1].append(func)
+                continue
+
+            try:
+                compiled = re.compile(pattern, re.IGNORECASE)
+            except re.error as ex:
+                raise KeywordException(f"invalid keyword pattern {pattern}: {ex}") from ex
+
+            for entry in cls._registered_patterns:
+                if entry[0] == pattern:
+                    entry[2].append(func)
+                    break
+            else:
+                cls._registered_patterns.append((pattern, compiled, [func]))
+
+    @classmethod
+    def _flush(cls) -> None:
+        """
+        Flushes registered keywords
+        Probably useless outside testing...
+        :return: None
+        """
+        cls._registered_keywords = {}
+        cls._registered_patterns = []
+        cls._compiled = None
+        cls._group_map = {}
+        cls._separate_patterns = []
+
+    @classmethod
+    def keyword(cls, *patterns, regex: bool = False):
+        """
+        React to the given keywords appearing anywhere in an ordinary message.
+
+        Handlers are called as `handler(bot, trigger, match)`, where `match` is the match object of
+        the handler's own pattern (so its groups are available).
+        :param patterns: keywords, matched case-insensitively as whole words
+        :param regex: treat patterns as regular expressions instead
+        """
+
+        def real_decorator(func):
+            cls.log.debug(f"registering keyword handler {func.__name__} for {patterns}")
+
+            @wraps(func)
+            async def wrapper(bot, trigger, match):
+                return await func(bot, trigger, match)
+
+            if not cls._register(wrapper, patterns, regex):
+                raise KeywordException("unable to register keyword handler.")
+            return wrapper
+        return real_decorator
+
+    @classmethod
+    def _compile(cls) -> None:
+        """
+        Build the combined pattern out of all registered keywords
+        :raises re.error: the patterns can't be combined
+        """
+        parts = []
+        cls._group_map = {}
+        cls._separate_patterns = []
+        group = 1
+        if cls._registered_keywords:
+            # not \b, keywords may start or end with non-word characters, e.g. nick[PC]
+            parts.append(rf"((?<!\w){_trie_pattern(cls._registered_keywords)}(?!\w))")
+            # keywords are resolved by their text instead
+            cls._group_map[group] = None
+            group += 1
+        for entry in cls._registered_patterns:
+            if _GROUP_REFERENCE.search(entry[0]):
+                cls._separate_patterns.append(entry)
+                continue
+            parts.append(f"({entry[0]})")
+            cls._group_map[group] = entry
+            # the outer group plus however many groups the pattern itself has
+            group += 1 + entry[1].groups
+        cls._compiled = re.compile("|".join(parts), re.IGNORECASE) if parts else None
+        cls.log.debug(f"compiled {len(cls._registered_keywords)} keyword(s) and "
+                      f"{len(cls._registered_patterns)} pattern(s)")
+
+    @classmethod
+    def scan(cls, message: str) -> list:
+        """
+        Find all registered keywords in a message
+        :param message: message body
+        :return: list of (handler, match) pairs, each handler only once per keyword
+        """
+        if not message:
+            return []
+
+        hits = []
+        seen = set()
+        for source, compiled, handlers in cls._separate_patterns:
+            match = compiled.search(message)
+            if match:
+                hits.extend((handler, match) for handler in handlers)
+        if cls._compiled is None:
+            return hits
+
+        for match in cls._compiled.finditer(message):
+            # the outer group closes last, so lastindex is always the alternative that matched
+            entry = cls._group_map[match.lastindex]
+            if entry is None:
+                key = match.group(0).lower()
+                if key not in cls._registered_keywords:
+                    # case-insensitive matching folded differently than str.lower()
+                    continue
+                compiled, handlers = cls._registered_keywords[key]
+            else:
+                key = (entry[0],)
+                compiled, handlers = entry[1:]
+            if key in seen:
+                continue
+            seen.add(key)
+            own_match = compiled.fullmatch(message, match.start(), match.end())
+            hits.extend((handler, own_match) for handler in handlers)
+        # in the order they appear in the message
+        hits.sort(key=lambda hit: hit[1].start())
+        return hits
+
+    @classmethod
+    async def _invoke(cls, handler, trigger: Trigger, match):
+        # inside the task gather() runs the handler in, so slow callbacks are blamed on it
+        with Watchdog.activity("keywords"):
+            return await handler(cls.bot, trigger, match)
+
+    @classmethod
+    async def dispatch(cls, hits: list, sender: str, channel: str) -> list:
+        """
+        Invoke the handlers found by `scan` concurrently
+        :param hits: result of `scan`
+        :param sender: author of the message
+        :param channel: channel of the message
+        :return: list of handler results (exceptions in place of failed handlers' results)
+        """
+        if not hits:
+            return []
+        if not cls.bot:
+            raise KeywordException(f"cls.bot is not set. (value = {cls.bot}")
+
+        trigger = Trigger.from_bot_user(cls.bot, sender, channel)
+        results = await asyncio.gather(*(cls._invoke(handler, trigger, match)
+                                         for handler, match in hits),
+                                       return_exceptions=True)
+        for (handler, match), result in zip(hits, results):
+            if isinstance(result, Exception):
+                cls.log.error(f"keyword handler {handler.__name__} for '{match.group(0)}' "
+                              f"raised {result!r}")
+        return results
+
+    @classmethod
+    async def trigger(cls, message: str, sender: str, channel: str) -> list:
+        """
+        Scan a message and invoke the handlers of every keyword found in it
+        :param message: message body
+        :param sender: author of the message
+        :param channel: channel of the message
+        :return: list of handler results
+        """
+        return await cls.dispatch(cls.scan(message), sender, channel)
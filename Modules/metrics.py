@@ -0,0 +1,132 @@
+"""
+metrics.py - Runtime counters and timing statistics
+
+Copyright (c) 2018 The Fuel Rats Mischief,
+All rights reserved.
+
+Licensed under the BSD 3-Clause License.
+
+See LICENSE.md
+
+This module is built on top of the Pydle system.
+
+"""
+from collections import deque
+from contextlib import contextmanager
+import logging
+import time
+
+import config
+
+
+class Metrics:
+    """
+    Collects named counters and timing samples
+
+    Timings keep only the most recent `config.Metrics.samples` observations per name, so memory use
+    stays bounded no matter how long the bot runs.
+    """
+
+    ####
+    # logger facility
+    log = logging.getLogger(f"{config.Logging.base_logger}.metrics")
+    ####
+    # name -> integer count
+    _counters = {}
+    ####
+    # name -> deque of durations (seconds)
+    _timings = {}
+
+    @classmethod
+    def increment(cls, name: str, amount: int = 1) -> None:
+        """
+        Increment a counter, creating it if needed
+        :param name: counter name
+        :param amount: value to add
+        """
+        cls._counters[name] = cls._counters.get(name, 0) + amount
+
+    @classmethod
+    def count(cls, name: str) -> int:
+        """
+        Current value of a counter
+        :param name: counter name
+        :return: count, 0 if never incremented
+        """
+        return cls._counters.get(name, 0)
+
+    @classmethod
+    def observe(cls, name: str, seconds: float) -> None:
+        """
+        Record a timing sample
+        :param name: timing name
+        :param seconds: duration to record
+        """
+        samples = cls._timings.get(name)
+        if samples is None:
+            samples = cls._timings[name] = deque(maxlen=config.Metrics.samples)
+        samples.append(seconds)
+
+    @classmethod
+    @contextmanager
+    def timer(cls, name: str):
+        """
+        Context manager timing its body into `name`
+
+        The sample is recorded even if the body raises.
+        :param name: timing name
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            cls.observe(name, time.perf_counter() - start)
+
+    @classmethod
+    def samples(cls, name: str) -> list:
+        """
+        Recorded samples for a timing, oldest first
+        :param name: timing name
+        :return: list of durations
+        """
+        return list(cls._timings.get(name, ()))
+
+    @classmethod
+    def percentiles(cls, name: str, *percents: float) -> dict:
+        """
+        Compute percentiles over the recorded samples of a timing (nearest-rank)
+        :param name: timing name
+        :param percents: percentiles to compute, defaults to 50, 90 and 99
+        :return: dict of percentile -> duration, empty if there are no samples
+        """
+        ordered = sorted(cls._timings.get(name, ()))
+        if not ordered:
+            return {}
+
+        percents = percents or (50, 90, 99)
+        result = {}
+        for percent in percents:
+            index = min(len(ordered) - 1, max(0, int(round(percent / 100 * len(ordered))) - 1))
+            result[percent] = ordered[index]
+        return result
+
+    @classmethod
+    def summary(cls) -> dict:
+        """
+        Snapshot of all counters and timing percentiles
+        :return: dict with `counters` and `timings` keys
+        """
+        return {
+            "counters": dict(cls._counters),
+            "timings": {name: cls.percentiles(name) for name in cls._timings}
+        }
+
+    @classmethod
+    def _flush(cls) -> None:
+        """
+        Forget all recorded metrics
+        Probably useless outside testing...
+        :return: None
+        """
+        cls._counters = {}
+        cls._timings = {}
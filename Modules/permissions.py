@@ -12,9 +12,11 @@ See LICENSE.md
 This module is built on top of the Pydle system.
 
 """
+import asyncio
 import logging
 from functools import wraps
 
+from Modules import audit, tracing
 import config
 
 log = logging.getLogger(f"{config.Logging.base_logger}.Permissions")
@@ -85,6 +87,21 @@ _by_vhost = {
 }
 
 
+def _audit(trigger, level: Permission or None, permission: Permission, words: list, result: str):
+    """
+    Record a gated command invocation in the audit log
+    :param trigger: `Trigger` of the invocation
+    :param level: the invoker's permission, if any
+    :param permission: permission the command requires
+    :param words: command words
+    :param result: outcome, e.g. `ok` or `denied`
+    """
+    audit.record(nickname=trigger.nickname, ident=trigger.ident, vhost=trigger.hostname,
+                 identified=trigger.identified, channel=trigger.channel,
+                 level=level.level if level is not None else None, required=permission.level,
+                 command=words[0], args=words[1:], result=result)
+
+
 def require_permission(permission: Permission, override_message: str or None = None):
     """
     Require an IRC command to be invoked by an authorized user.
@@ -100,15 +117,31 @@ def require_permission(permission: Permission, override_message: str or None = N
 
         @wraps(func)
         async def guarded(bot, trigger, words, words_eol):
-            if trigger.identified and trigger.hostname in _by_vhost.keys() \
-                    and _by_vhost[trigger.hostname] >= permission:
+            with tracing.span("permission", required=permission.level) as span:
+                level = _by_vhost.get(trigger.hostname) if trigger.identified else None
+                granted = level is not None and level >= permission
+                if span is not None:
+                    span.attributes["granted"] = granted
+            if granted:
                 try:
-                    # This works if we're the bottommost decorator (calling the command function directly)
-                    return await func(bot, trigger)
-                except TypeError:
-                    # Otherwise, we're giving all the things to the underlying wrapper (be it from parametrize or sth)
-                    return await func(bot, trigger, words, words_eol)
+                    try:
+                        # This works if we're the bottommost decorator
+                        # (calling the command function directly)
+                        result = await func(bot, trigger)
+                    except TypeError:
+                        # Otherwise, we're giving all the things to the underlying wrapper
+                        # (be it from parametrize or sth)
+                        result = await func(bot, trigger, words, words_eol)
+                except asyncio.CancelledError:
+                    _audit(trigger, level, permission, words, "cancelled")
+                    raise
+                except Exception as ex:
+                    _audit(trigger, level, permission, words, f"error: {ex!r}")
+                    raise
+                _audit(trigger, level, permission, words, "ok")
+                return result
             else:
+                _audit(trigger, level, permission, words, "denied")
                 await trigger.reply(override_message if override_message else permission.denied_message)
 
         return guarded
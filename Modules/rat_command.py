@@ -12,10 +12,14 @@ This module is built on top of the Pydle system.
 
 """
 
+import asyncio
 from functools import wraps
 import logging
 
+from Modules.metrics import Metrics
+from Modules import tracing
 from Modules.trigger import Trigger
+from Modules.watchdog import Watchdog
 import config
 
 # set the logger for handlers
@@ -103,32 +107,88 @@ class Commands:
             log.debug(f"ignoring message{message} as it does not start with my prefix.")
             return None
         else:
-            raw_command: str = message.lstrip(cls.prefix)  # remove command prefix
-
-            words = []
-            words_eol = []
-            remaining = raw_command
-            while True:
-                words_eol.append(remaining)
-                try:
-                    word, remaining = remaining.split(maxsplit=1)
-                except ValueError:
-                    # we couldn't split -> only one word left
-                    words.append(remaining)
-                    break
+            with tracing.trace("trigger", sender=sender, channel=channel) as root:
+                with tracing.span("tokenize"):
+                    words, words_eol = cls._tokenize(message)
+                if root is not None:
+                    root.attributes["command"] = words[0]
+
+                with tracing.span("lookup"):
+                    trigger = Trigger.from_bot_user(cls.bot, sender, channel)
+
+                cls.log.debug(f"words={words}\ncommand={words[0]}\nargs={words[1:]}")
+                if words[0] not in cls._registered_commands:
+                    cls.log.error(f"unable to find command.{words[0]}")
+                    raise CommandNotFoundException(f"Unable to find command {words[0]}")
                 else:
-                    words.append(word)
-
-            trigger = Trigger.from_bot_user(cls.bot, sender, channel)
+                    cls.log.debug("found command, invoking...")
+                    return await cls._invoke(words[0], trigger, words, words_eol)
 
-            cls.log.debug(f"words={words}\ncommand={words[0]}\nargs={words[1:]}")
-            if words[0] not in cls._registered_commands:
-                cls.log.error(f"unable to find command.{words[0]}")
-                raise CommandNotFoundException(f"Unable to find command {words[0]}")
+    @classmethod
+    def _tokenize(cls, message: str) -> tuple:
+        """
+        Split a command message into words
+        :param message: message, including the prefix
+        :return: (words, words_eol), where `words_eol[n]` is the message from `words[n]` on
+        """
+        raw_command: str = message.lstrip(cls.prefix)  # remove command prefix
+
+        words = []
+        words_eol = []
+        remaining = raw_command
+        while True:
+            words_eol.append(remaining)
+            try:
+                word, remaining = remaining.split(maxsplit=1)
+            except ValueError:
+                # we couldn't split -> only one word left
+                words.append(remaining)
+                break
             else:
-                cls.log.debug("found command, invoking...")
-                cmd = cls.get_command(words[0])
-                return await cmd(cls.bot, trigger, words, words_eol)
+                words.append(word)
+        return words, words_eol
+
+    @classmethod
+    async def _invoke(cls, name: str, trigger: Trigger, words: list, words_eol: list):
+        """
+        Run a registered command with its timeout, sending its coalesced replies afterwards
+        :param name: command name
+        :return: whatever the command returned, None if it timed out
+        :raises asyncio.TimeoutError: the command's own, hitting the deadline doesn't raise
+        """
+        cmd = cls.get_command(name)
+        timeout = getattr(cmd, "timeout", None)
+        if timeout is None:
+            timeout = config.Commands.timeout
+        # set if the command raised a TimeoutError of its own, e.g. waiting on an API
+        own_timeout = False
+
+        async def run():
+            nonlocal own_timeout
+            # inside the task wait_for() may run the command in, so slow callbacks are blamed on it
+            with Watchdog.activity(f"command.{name}"):
+                try:
+                    return await cmd(cls.bot, trigger, words, words_eol)
+                except asyncio.TimeoutError:
+                    own_timeout = True
+                    raise
+
+        with trigger.buffered() as replies:
+            try:
+                with Metrics.timer(f"command.{name}"), tracing.span("command", timeout=timeout):
+                    return await asyncio.wait_for(run(), timeout)
+            except asyncio.TimeoutError:
+                if own_timeout:
+                    raise
+                cls.log.warning(f"command {name} invoked by {trigger.nickname} "
+                                f"timed out after {timeout}s")
+                Metrics.increment("commands.timeout")
+                Metrics.increment(f"command.{name}.timeout")
+                await trigger.reply(config.Commands.timeout_message)
+                return None
+            finally:
+                with tracing.span("flush", replies=len(replies)):
+                    await replies.flush()
 
     @classmethod
     def _register(cls, func, names: list or str) -> bool:
@@ -156,6 +216,18 @@ class Commands:
 
             return True
 
+    @classmethod
+    def _unregister(cls, names: list or str) -> None:
+        """
+        Remove registered commands, e.g. facts that were deleted
+        :param names: names to remove, unknown names are ignored
+        :return: None
+        """
+        if isinstance(names, str):
+            names = [names]
+        for alias in names:
+            cls._registered_commands.pop(alias, None)
+
     @classmethod
     def _flush(cls)->None:
         """
@@ -166,7 +238,13 @@ class Commands:
         cls._registered_commands = {}
 
     @classmethod
-    def command(cls, *aliases):
+    def command(cls, *aliases, timeout: float = None):
+        """
+        Register the decorated coroutine as a command
+        :param aliases: names the command can be invoked by
+        :param timeout: seconds the command may run before it is cancelled.
+            Defaults to `config.Commands.timeout`.
+        """
         # stuff that occurs here executes when the wrapped command is first computed
         # use this space for command registration
 
@@ -186,6 +264,8 @@ class Commands:
                     # Otherwise, we're giving all the things to the underlying wrapper (be it from parametrize or sth)
                     return await func(bot, trigger, words, words_eol)
 
+            wrapper.timeout = timeout
+
             # we want to register the wrapper, not the underlying function
             cls.log.debug(f"registering command with aliases: {aliases}...")
             if not cls._register(wrapper, aliases):
@@ -0,0 +1,134 @@
+"""
+reply_buffer.py - Coalesces replies and splits them into IRC sized lines
+
+Copyright (c) 2018 The Fuel Rats Mischief,
+All rights reserved.
+
+Licensed under the BSD 3-Clause License.
+
+See LICENSE.md
+
+This module is built on top of the Pydle system.
+
+"""
+import logging
+
+import pydle
+
+from Modules import tracing
+import config
+
+log = logging.getLogger(f"{config.Logging.base_logger}.reply_buffer")
+
+
+def line_overhead(bot: pydle.BasicClient, target: str) -> int:
+    """
+    Number of bytes the server adds around the text of a PRIVMSG we send to `target`
+
+    The server relays `:nick!ident@host PRIVMSG target :text\\r\\n`. We don't reliably know our
+    own ident and host, so the configured maximum lengths are reserved for them.
+    :param bot: Instance of the bot.
+    :param target: message target
+    :return: overhead in bytes
+    """
+    nickname = getattr(bot, "nickname", None) or config.IRC.presence
+    prefix = f":{nickname}!@ PRIVMSG {target} :\r\n".encode("utf-8")
+    return len(prefix) + config.IRC.max_ident_length + config.IRC.max_host_length
+
+
+def split_message(message: str, limit: int) -> list:
+    """
+    Split a message into lines of at most `limit` UTF-8 encoded bytes each
+
+    Explicit newlines are honoured, long lines are cut on the last space that fits. Words longer
+    than `limit` are cut on a character boundary. Blank lines are dropped, each would cost a
+    PRIVMSG of its own.
+    :param message: text to split
+    :param limit: maximum encoded length per line, in bytes
+    :return: list of lines, empty if there is nothing to send
+    """
+    if limit < 4:
+        raise ValueError(f"line limit of {limit} bytes cannot fit a single character")
+
+    lines = []
+    for line in message.replace("\r", "").split("\n"):
+        encoded = line.encode("utf-8")
+        while len(encoded) > limit:
+            cut = encoded.rfind(b" ", 0, limit + 1)
+            if cut > 0:
+                lines.append(encoded[:cut].decode("utf-8"))
+                encoded = encoded[cut + 1:]
+            else:
+                cut = limit
+                # don't cut through a multi-byte character (continuation bytes are 0b10xxxxxx)
+                while encoded[cut] & 0xC0 == 0x80:
+                    cut -= 1
+                lines.append(encoded[:cut].decode("utf-8"))
+                encoded = encoded[cut:]
+        lines.append(encoded.decode("utf-8"))
+    return [line for line in lines if line.strip()]
+
+
+class ReplyBuffer(object):
+    """
+    Collects the replies of a single command invocation to a single target
+
+    On flush, consecutive replies are merged onto the same line (joined with
+    `config.Commands.reply_separator`) as long as the result fits into one IRC line, and anything
+    too long is split on word boundaries.
+    """
+
+    def __init__(self, bot: pydle.BasicClient, target: str):
+        self.bot = bot
+        self.target = target
+        self._replies = []
+
+    def __len__(self):
+        return len(self._replies)
+
+    def add(self, message: str) -> None:
+        """Queue a reply for the next flush."""
+        self._replies.append(message)
+
+    def lines(self) -> list:
+        """
+        Compute the lines the queued replies coalesce into
+        :return: list of lines, each fitting into a single PRIVMSG
+        """
+        limit = config.IRC.line_length - line_overhead(self.bot, self.target)
+        separator = config.Commands.reply_separator
+        separator_size = len(separator.encode("utf-8"))
+
+        lines = []
+        sizes = []
+        for reply in self._replies:
+            new_lines = split_message(reply, limit)
+            if not new_lines:
+                continue
+            first = new_lines[0]
+            first_size = len(first.encode("utf-8"))
+            # only merge across reply boundaries, newlines inside a reply are intentional
+            if lines and sizes[-1] + separator_size + first_size <= limit:
+                lines[-1] = f"{lines[-1]}{separator}{first}"
+                sizes[-1] += separator_size + first_size
+                new_lines = new_lines[1:]
+            for line in new_lines:
+                lines.append(line)
+                sizes.append(len(line.encode("utf-8")))
+        return lines
+
+    async def flush(self) -> int:
+        """
+        Send all queued replies
+        :return: number of lines sent
+        """
+        if not self._replies:
+            return 0
+
+        lines = self.lines()
+        self._replies = []
+        log.debug(f"flushing {len(lines)} line(s) to {self.target}")
+        for line in lines:
+            with tracing.span("send", target=self.target, length=len(line)):
+                await self.bot.message(self.target, line)
+        return len(lines)
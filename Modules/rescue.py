@@ -0,0 +1,207 @@
+"""
+rescue.py - Rescue records and the rescue board
+
+Copyright (c) 2018 The Fuel Rats Mischief,
+All rights reserved.
+
+Licensed under the BSD 3-Clause License.
+
+See LICENSE.md
+
+This module is built on top of the Pydle system.
+
+"""
+import logging
+from uuid import uuid4
+
+from Modules.user_index import casefold
+import config
+
+log = logging.getLogger(f"{config.Logging.base_logger}.rescue")
+
+
+class Rescue(object):
+    """
+    A single rescue, tracking which fields changed since it was last synchronized
+
+    Assigning to a field in `fields` marks it dirty. Use new values rather than mutating them in
+    place (hence `rats` is a tuple), in-place changes are not noticed.
+    """
+
+    ####
+    # fields synchronized with the backend
+    fields = ("client", "system", "platform", "active", "code_red", "rats", "board_index")
+
+    def __init__(self, client: str, system: str = None, platform: str = None, active: bool = True,
+                 code_red: bool = False, rats: tuple = (), board_index: int = None,
+                 uuid: str = None, version: int = 0):
+        """
+        :param client: client's nickname
+        :param system: system the client is in
+        :param platform: client's platform, e.g. `pc`
+        :param active: whether the case is active
+        :param code_red: whether the client is on emergency oxygen
+        :param rats: nicknames of the assigned rats
+        :param board_index: case number on the board
+        :param uuid: backend identifier, generated for new rescues
+        :param version: backend version this record is based on, 0 if never synchronized
+        """
+        object.__setattr__(self, "_board", None)
+        object.__setattr__(self, "dirty", set(self.fields) if version == 0 else set())
+        self.uuid = uuid or str(uuid4())
+        self.version = version
+        for name, value in (("client", client), ("system", system), ("platform", platform),
+                            ("active", active), ("code_red", code_red), ("rats", tuple(rats)),
+                            ("board_index", board_index)):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        if name in self.fields:
+            old = getattr(self, name)
+            if old == value:
+                return
+            object.__setattr__(self, name, value)
+            self.dirty.add(name)
+            if self._board is not None:
+                self._board._reindex(self, name, old)
+        else:
+            object.__setattr__(self, name, value)
+
+    def __repr__(self):
+        return f"Rescue(client={self.client!r}, board_index={self.board_index!r}, " \
+               f"uuid={self.uuid!r}, version={self.version!r})"
+
+    def delta(self) -> dict:
+        """
+        The unsynchronized changes of this rescue
+        :return: dict with `uuid`, `version` (the base version) and the dirty `fields`
+        """
+        return {"uuid": self.uuid, "version": self.version,
+                "fields": {name: getattr(self, name) for name in self.dirty}}
+
+    def state(self) -> dict:
+        """
+        All synchronized fields, as in a delta containing everything
+        """
+        return {"uuid": self.uuid, "version": self.version,
+                "fields": {name: getattr(self, name) for name in self.fields}}
+
+    def apply(self, fields: dict, version: int) -> None:
+        """
+        Apply changes that came from the backend. They are not marked dirty.
+        :param fields: field name -> new value
+        :param version: backend version after these changes
+        """
+        for name, value in fields.items():
+            if name not in self.fields:
+                log.warning(f"ignoring unknown rescue field {name} for {self.uuid}")
+                continue
+            if name == "rats":
+                value = tuple(value)
+            old = getattr(self, name)
+            object.__setattr__(self, name, value)
+            self.dirty.discard(name)
+            if self._board is not None and old != value:
+                self._board._reindex(self, name, old)
+        self.version = version
+
+
+class RescueBoard(object):
+    """
+    The rescues the bot knows about
+
+    Rescues are indexed by uuid, board index and (casefolded) client nickname. The indexes are
+    updated one entry at a time as fields change, they are never rebuilt.
+
+    Board indexes are unique. A rescue given an index another rescue already has (e.g. one that
+    arrived from the backend) is moved to the first free index instead, which is then marked
+    dirty so the backend learns about it.
+    """
+
+    def __init__(self):
+        self._by_uuid = {}
+        self._by_index = {}
+        self._by_client = {}
+
+    def __len__(self):
+        return len(self._by_uuid)
+
+    def __iter__(self):
+        return iter(list(self._by_uuid.values()))
+
+    def __contains__(self, rescue: Rescue) -> bool:
+        return rescue.uuid in self._by_uuid
+
+    def add(self, rescue: Rescue) -> Rescue:
+        """
+        Put a rescue on the board, assigning the first free board index if it has none
+        :return: the rescue
+        """
+        if rescue.board_index is None:
+            rescue.board_index = self.free_index()
+        self._by_uuid[rescue.uuid] = rescue
+        self._claim_index(rescue)
+        if rescue.client:
+            self._by_client[casefold(rescue.client)] = rescue
+        object.__setattr__(rescue, "_board", self)
+        return rescue
+
+    def remove(self, rescue: Rescue) -> None:
+        """Take a rescue off the board."""
+        del self._by_uuid[rescue.uuid]
+        if self._by_index.get(rescue.board_index) is rescue:
+            del self._by_index[rescue.board_index]
+        if rescue.client and self._by_client.get(casefold(rescue.client)) is rescue:
+            del self._by_client[casefold(rescue.client)]
+        object.__setattr__(rescue, "_board", None)
+
+    def free_index(self) -> int:
+        """Lowest board index not in use."""
+        index = 0
+        while index in self._by_index:
+            index += 1
+        return index
+
+    def by_uuid(self, uuid: str) -> Rescue or None:
+        return self._by_uuid.get(uuid)
+
+    def by_index(self, index: int) -> Rescue or None:
+        return self._by_index.get(index)
+
+    def by_client(self, nickname: str) -> Rescue or None:
+        """Find a rescue by client nickname, compared under IRC casemapping."""
+        return self._by_client.get(casefold(nickname))
+
+    def dirty(self) -> list:
+        """Rescues with unsynchronized changes."""
+        return [rescue for rescue in self._by_uuid.values() if rescue.dirty]
+
+    def _claim_index(self, rescue: Rescue) -> None:
+        """Enter a rescue under its board index, moving it to a free one if that is taken."""
+        holder = self._by_index.get(rescue.board_index)
+        if holder is not None and holder is not rescue:
+            index = self.free_index()
+            log.warning(f"board index {rescue.board_index} of {rescue.uuid} is taken by "
+                        f"{holder.uuid}, moving it to {index}")
+            object.__setattr__(rescue, "board_index", index)
+            rescue.dirty.add("board_index")
+        self._by_index[rescue.board_index] = rescue
+
+    def _reindex(self, rescue: Rescue, field: str, old) -> None:
+        """Move a single rescue within the index of a changed field."""
+        if field == "board_index":
+            if old is not None and self._by_index.get(old) is rescue:
+                del self._by_index[old]
+            if rescue.board_index is not None:
+                self._claim_index(rescue)
+            return
+        if field == "client":
+            index = self._by_client
+            old_key = casefold(old) if old else None
+            new_key = casefold(rescue.client) if rescue.client else None
+        else:
+            return
+        if old_key is not None and index.get(old_key) is rescue:
+            del index[old_key]
+        if new_key is not None:
+            index[new_key] = rescue
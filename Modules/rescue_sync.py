@@ -0,0 +1,144 @@
+"""
+rescue_sync.py - Incremental synchronization of the rescue board with a backend
+
+Copyright (c) 2018 The Fuel Rats Mischief,
+All rights reserved.
+
+Licensed under the BSD 3-Clause License.
+
+See LICENSE.md
+
+This module is built on top of the Pydle system.
+
+"""
+import asyncio
+import logging
+
+from Modules.metrics import Metrics
+from Modules.rescue import Rescue, RescueBoard
+import config
+
+log = logging.getLogger(f"{config.Logging.base_logger}.rescue_sync")
+
+
+class SyncException(Exception):
+    """
+    The backend could not be reached or refused a batch.
+    """
+    pass
+
+
+class RescueSync(object):
+    """
+    Sends local rescue changes to a backend as deltas and applies the backend's deltas locally
+
+    The backend is any object providing two coroutines:
+
+    `push(deltas)` takes a list of deltas (see `Rescue.delta`) and returns one result per delta,
+    either `{"uuid", "version"}` when it was accepted, or `{"uuid", "version", "fields",
+    "conflict": True}` when the delta's base version was outdated. `fields` then holds the
+    backend's current values.
+
+    `pull(cursor)` returns `(deltas, cursor)`: every change since `cursor` (None for everything)
+    and the cursor to continue from next time.
+
+    Conflicts are resolved by version: the backend's newer values win for the fields it sent,
+    local changes to other fields are kept and pushed again on top of the new version.
+    """
+
+    def __init__(self, board: RescueBoard, backend, interval: float = None,
+                 batch_size: int = None):
+        """
+        :param board: rescue board to synchronize
+        :param backend: see class documentation
+        :param interval: seconds between synchronizations, defaults to `config.Sync.interval`
+        :param batch_size: maximum deltas per push, defaults to `config.Sync.batch_size`
+        """
+        self.board = board
+        self.backend = backend
+        self.interval = interval or config.Sync.interval
+        self.batch_size = batch_size or config.Sync.batch_size
+        self.cursor = None
+
+    async def push(self) -> int:
+        """
+        Send the changes of all dirty rescues, coalesced into one delta per rescue
+        :return: number of deltas sent
+        """
+        sent = 0
+        dirty = self.board.dirty()
+        for start in range(0, len(dirty), self.batch_size):
+            batch = dirty[start:start + self.batch_size]
+            deltas = [rescue.delta() for rescue in batch]
+            # changes made while the batch is in flight become dirty again on top of it
+            for rescue in batch:
+                rescue.dirty.clear()
+
+            try:
+                results = await self.backend.push(deltas)
+            except Exception as ex:
+                for rescue, delta in zip(batch, deltas):
+                    rescue.dirty.update(delta["fields"])
+                raise SyncException(f"unable to push {len(deltas)} rescue delta(s)") from ex
+
+            for rescue, delta, result in zip(batch, deltas, results):
+                if result.get("conflict"):
+                    Metrics.increment("sync.conflicts")
+                    log.info(f"conflict on rescue {rescue.uuid}, backend is at {result['version']}")
+                    remote = result.get("fields", {})
+                    rescue.apply(remote, result["version"])
+                    # local changes the backend didn't override still need to be sent
+                    rescue.dirty.update(delta["fields"].keys() - remote.keys())
+                else:
+                    rescue.version = result["version"]
+            sent += len(deltas)
+        Metrics.increment("sync.pushed", sent)
+        return sent
+
+    def receive(self, deltas: list) -> int:
+        """
+        Apply deltas that came from the backend
+        :param deltas: list of `{"uuid", "version", "fields"}`
+        :return: number of deltas applied (stale ones are skipped)
+        """
+        applied = 0
+        for delta in deltas:
+            rescue = self.board.by_uuid(delta["uuid"])
+            if rescue is None:
+                rescue = Rescue(delta["fields"].get("client"), uuid=delta["uuid"],
+                                version=delta["version"])
+                rescue.apply(delta["fields"], delta["version"])
+                self.board.add(rescue)
+            elif delta["version"] > rescue.version:
+                rescue.apply(delta["fields"], delta["version"])
+            else:
+                continue
+            applied += 1
+        Metrics.increment("sync.received", applied)
+        return applied
+
+    async def pull(self) -> int:
+        """
+        Fetch and apply the backend's changes since the last pull
+        :return: number of deltas applied
+        """
+        try:
+            deltas, self.cursor = await self.backend.pull(self.cursor)
+        except Exception as ex:
+            raise SyncException("unable to pull rescue deltas") from ex
+        return self.receive(deltas)
+
+    async def sync(self) -> None:
+        """Push local changes, then pull remote ones."""
+        with Metrics.timer("sync"):
+            await self.push()
+            await self.pull()
+
+    async def run(self) -> None:
+        """Synchronize every `interval` seconds, forever."""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sync()
+            except SyncException as ex:
+                log.error(f"{ex}: {ex.__cause__!r}")
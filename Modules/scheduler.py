@@ -0,0 +1,214 @@
+"""
+scheduler.py - Priority lanes for inbound messages and outbound replies
+
+Copyright (c) 2018 The Fuel Rats Mischief,
+All rights reserved.
+
+Licensed under the BSD 3-Clause License.
+
+See LICENSE.md
+
+This module is built on top of the Pydle system.
+
+"""
+import asyncio
+from collections import deque
+import contextvars
+from enum import IntEnum
+import logging
+import time
+
+from Modules.metrics import Metrics
+from Modules.rat_command import Commands
+import config
+
+log = logging.getLogger(f"{config.Logging.base_logger}.scheduler")
+
+
+class Lane(IntEnum):
+    """
+    Priority lanes, most urgent first
+    """
+    EMERGENCY = 0
+    DISPATCH = 1
+    NORMAL = 2
+
+
+class Job(object):
+    """A unit of work waiting in (or running from) a `LaneScheduler`."""
+    __slots__ = ("lane", "key", "submitted", "origin", "func", "args", "kwargs", "future")
+
+    def __init__(self, lane: Lane, func, args, kwargs, future: asyncio.Future,
+                 origin: float = None, key=None):
+        """
+        :param origin: when the work this job is part of started, defaults to now
+        :param key: jobs in the same lane with the same key run one at a time, in order
+        """
+        self.lane = lane
+        self.key = key
+        self.submitted = time.perf_counter()
+        self.origin = self.submitted if origin is None else origin
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = future
+
+
+####
+# the inbound job the current task is working on, so outbound replies inherit its lane
+current_job = contextvars.ContextVar("current_job", default=None)
+
+
+def classify(message: str) -> Lane:
+    """
+    Decide which lane an inbound message belongs in
+    :param message: message body
+    :return: `Lane`
+    """
+    lowered = message.lower()
+    if any(keyword in lowered for keyword in config.Scheduler.emergency_keywords):
+        return Lane.EMERGENCY
+    if message.startswith(Commands.prefix):
+        command = message[len(Commands.prefix):].split(maxsplit=1)
+        if command and command[0].lower() in config.Scheduler.dispatch_commands:
+            return Lane.DISPATCH
+    return Lane.NORMAL
+
+
+class LaneScheduler(object):
+    """
+    Runs submitted coroutines from per-lane queues using weighted round robin
+
+    Each lane gets `config.Scheduler.weights[lane]` picks per round before a lane with fewer
+    credits is served, so urgent work jumps the queue without starving routine work entirely.
+
+    Jobs run concurrently, up to `concurrency` at a time, so a slow job doesn't hold up the ones
+    queued behind it. Jobs submitted with the same `_key` in the same lane are the exception: they
+    run one at a time in the order they were submitted (e.g. an `!assign` finishes before the
+    `!go` that follows it in the same channel), other jobs pass them while they wait.
+
+    Time spent queued is recorded as `<name>.wait.<lane>` and time from the job's origin until it
+    finished as `<name>.latency.<lane>`. Outbound jobs originate with their parent inbound job,
+    so `outbound.latency.emergency` is the ratsignal-to-announcement latency.
+    """
+
+    def __init__(self, name: str, concurrency: int = 1, weights: tuple = None):
+        """
+        :param name: name used for logging and metrics
+        :param concurrency: number of jobs allowed to run at the same time
+        :param weights: picks per round for each lane, defaults to `config.Scheduler.weights`
+        """
+        self.name = name
+        self.concurrency = concurrency
+        self.weights = weights if weights is not None else config.Scheduler.weights
+        self._queues = {lane: deque() for lane in Lane}
+        self._credits = {lane: self.weights[lane] for lane in Lane}
+        # set whenever a job is queued or finishes, so idle workers look for work
+        self._changed = None
+        # (lane, key) of the running jobs that have a key
+        self._busy = set()
+        self._workers = []
+        self._stopping = False
+
+    def __len__(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    def start(self) -> None:
+        """Spawn the worker tasks on the running event loop."""
+        if self._workers:
+            return
+        self._changed = asyncio.Event()
+        self._stopping = False
+        self._workers = [asyncio.ensure_future(self._work()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        """Cancel the worker tasks. Queued jobs stay queued."""
+        workers, self._workers = self._workers, []
+        self._stopping = True
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    def submit(self, lane: Lane, func, *args, **kwargs) -> asyncio.Future:
+        """
+        Queue `func(*args, **kwargs)` to be awaited in the given lane
+
+        Outbound schedulers can pass the inbound job being replied to as `_parent`, which is
+        used to measure the end-to-end latency of emergency lane work. Jobs that have to run in
+        order can pass a `_key`, e.g. their channel.
+        :return: future resolving to the coroutine's result
+        """
+        parent = kwargs.pop("_parent", None)
+        key = kwargs.pop("_key", None)
+        future = asyncio.get_event_loop().create_future()
+        job = Job(lane, func, args, kwargs, future,
+                  origin=parent.origin if parent is not None else None, key=key)
+        self._queues[lane].append(job)
+        if self._workers:
+            self._changed.set()
+        else:
+            self.start()
+        return future
+
+    def _runnable(self, lane: Lane) -> int or None:
+        """Position of the first job in a lane's queue that isn't waiting for its key."""
+        for position, job in enumerate(self._queues[lane]):
+            if job.key is None or (lane, job.key) not in self._busy:
+                return position
+        return None
+
+    def _next_job(self) -> Job or None:
+        """
+        Pick the next job according to lane weights, skipping jobs whose key is in use
+        :return: `Job`, None if there is nothing to run right now
+        """
+        runnable = {lane: self._runnable(lane) for lane in Lane}
+        waiting = [lane for lane, position in runnable.items() if position is not None]
+        if not waiting:
+            return None
+        if not any(self._credits[lane] for lane in waiting):
+            self._credits = {lane: self.weights[lane] for lane in Lane}
+        lane = max(waiting, key=lambda candidate: (self._credits[candidate], -candidate))
+        self._credits[lane] = max(0, self._credits[lane] - 1)
+        queue = self._queues[lane]
+        job = queue[runnable[lane]]
+        del queue[runnable[lane]]
+        if job.key is not None:
+            self._busy.add((lane, job.key))
+        return job
+
+    async def _work(self) -> None:
+        while True:
+            job = self._next_job()
+            if job is None:
+                self._changed.clear()
+                await self._changed.wait()
+                continue
+            lane_name = job.lane.name.lower()
+            Metrics.observe(f"{self.name}.wait.{lane_name}", time.perf_counter() - job.submitted)
+
+            token = current_job.set(job)
+            try:
+                result = await job.func(*job.args, **job.kwargs)
+            except asyncio.CancelledError:
+                job.future.cancel()
+                if self._stopping:
+                    raise
+                # the job was cancelled, not this worker, e.g. it awaited a cancelled future
+                log.warning(f"{self.name} job {job.func.__name__} in lane {lane_name} "
+                            f"was cancelled")
+            except Exception as ex:
+                log.error(f"{self.name} job {job.func.__name__} in lane {lane_name} raised {ex!r}")
+                if not job.future.done():
+                    job.future.set_exception(ex)
+                    # mark as retrieved, fire-and-forget submitters already got it logged
+                    job.future.exception()
+            else:
+                if not job.future.done():
+                    job.future.set_result(result)
+            finally:
+                current_job.reset(token)
+                self._busy.discard((job.lane, job.key))
+                self._changed.set()
+                Metrics.observe(f"{self.name}.latency.{lane_name}",
+                                time.perf_counter() - job.origin)
@@ -0,0 +1,236 @@
+"""
+snapshot.py - Periodic state snapshots for warm restarts
+
+Copyright (c) 2018 The Fuel Rats Mischief,
+All rights reserved.
+
+Licensed under the BSD 3-Clause License.
+
+See LICENSE.md
+
+This module is built on top of the Pydle system.
+
+"""
+import asyncio
+import io
+import logging
+import os
+import pickle
+import time
+
+from Modules.metrics import Metrics
+from Modules.rescue import Rescue
+from Modules.user_index import UserIndex, DEFAULT_CASE_MAPPING
+import config
+
+log = logging.getLogger(f"{config.Logging.base_logger}.snapshot")
+
+####
+# bumped whenever the layout of a snapshot changes, snapshots in other formats are ignored
+FORMAT = 2
+
+####
+# user fields taken from a snapshot for users the server hasn't told us about yet.
+# Identification is deliberately missing: the nickname may have changed hands while we were gone,
+# so only the server gets to say who is identified.
+WARM_USER_FIELDS = ("username", "realname", "hostname")
+
+
+class SnapshotException(Exception):
+    """
+    A snapshot exists but can't be used.
+    """
+    pass
+
+
+class _Unpickler(pickle.Unpickler):
+    """Refuses anything but plain data, which is all a snapshot ever contains."""
+
+    def find_class(self, module, name):
+        if module == "datetime" and name in ("date", "datetime", "timedelta", "timezone"):
+            return super().find_class(module, name)
+        raise pickle.UnpicklingError(f"unexpected {module}.{name} in snapshot")
+
+
+####
+# how each section of a snapshot is collected from the bot, in the order they are written.
+# Channels are only rejoined, so only their names are kept. Keyed channels are left out, their
+# keys don't belong in a file on disk and without them rejoining fails anyway
+_SECTIONS = (
+    ("users", lambda bot: dict(bot.users)),
+    ("channels", lambda bot: [name for name, channel in bot.channels.items()
+                              if not channel.get("password")]),
+    ("rescues", lambda bot: [(rescue.state(), sorted(rescue.dirty)) for rescue in bot.board]),
+    ("history", lambda bot: [tuple(line) for line in bot.history.lines()]),
+)
+
+
+def _dump(value) -> bytes:
+    return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def chunks(bot):
+    """
+    Serialize a bot's state one section at a time
+
+    Each section is consistent in itself, so callers can let other work run in between.
+    :param bot: bot with `users`, `channels`, `board` and `history`
+    :return: iterator of byte strings, which concatenated make up the snapshot
+    """
+    yield _dump({"format": FORMAT, "time": time.time(),
+                 "sections": [name for name, capture in _SECTIONS]})
+    for name, capture in _SECTIONS:
+        yield _dump(capture(bot))
+
+
+def dumps(state: dict) -> bytes:
+    """Serialize a snapshot dict, as returned by `loads()`."""
+    header = {"format": state["format"], "time": state["time"],
+              "sections": [name for name, capture in _SECTIONS]}
+    return _dump(header) + b"".join(_dump(state[name]) for name, capture in _SECTIONS)
+
+
+def loads(data: bytes) -> dict:
+    """
+    Deserialize a snapshot
+    :return: dict with `format`, `time` and one entry per section
+    """
+    stream = io.BytesIO(data)
+    state = _Unpickler(stream).load()
+    for name in state.pop("sections"):
+        # every section is a pickle of its own, with its own memo
+        state[name] = _Unpickler(stream).load()
+    return state
+
+
+def write(path: str, data: bytes) -> None:
+    """
+    Replace the snapshot at `path` atomically, a crash midway leaves the previous one intact
+    :param path: snapshot file
+    :param data: serialized snapshot
+    """
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+
+def read(path: str, max_age: float = None) -> dict or None:
+    """
+    Load a snapshot
+    :param path: snapshot file
+    :param max_age: seconds after which a snapshot is considered stale, defaults to
+        `config.Snapshot.max_age`
+    :return: snapshot dict, None if there is no snapshot or it is stale
+    :raises SnapshotException: the snapshot is unreadable or in a different format
+    """
+    max_age = max_age if max_age is not None else config.Snapshot.max_age
+    try:
+        with open(path, "rb") as file:
+            data = file.read()
+    except FileNotFoundError:
+        return None
+    try:
+        state = loads(data)
+    except Exception as ex:
+        raise SnapshotException(f"unable to load snapshot {path}") from ex
+    if state.get("format") != FORMAT:
+        raise SnapshotException(f"snapshot {path} is in an unknown format")
+
+    age = time.time() - state["time"]
+    if age > max_age:
+        log.info(f"ignoring snapshot {path}, it is {age:.0f}s old")
+        return None
+    return state
+
+
+def restore(bot, state: dict) -> None:
+    """
+    Warm a freshly created bot up from a snapshot, before it connects
+
+    Rescues and history are restored right away. Users and channels are only kept aside in
+    `bot.warm_users` and `bot.warm_channels`, the server's view replaces them as it comes in.
+    :param bot: bot with `users`, `board` and `history`
+    :param state: snapshot dict from `read()`
+    """
+    for fields, dirty in state["rescues"]:
+        rescue = Rescue(uuid=fields["uuid"], version=fields["version"], **fields["fields"])
+        rescue.dirty = set(dirty)
+        bot.board.add(rescue)
+    for line in state["history"]:
+        timestamp, channel, nickname, message = line
+        bot.history.record(channel, nickname, message, timestamp=timestamp)
+
+    case_mapping = getattr(bot.users, "case_mapping", DEFAULT_CASE_MAPPING)
+    bot.warm_users = UserIndex(state["users"], case_mapping=case_mapping)
+    bot.warm_channels = list(state["channels"])
+    log.info(f"restored {len(state['rescues'])} rescue(s), {len(state['history'])} history "
+             f"line(s) and {len(bot.warm_users)} user(s) from a snapshot taken at "
+             f"{time.ctime(state['time'])}")
+
+
+def warm_user(user: dict, warm: dict) -> None:
+    """
+    Fill in what the server hasn't told us (yet) about a user from their snapshot
+    :param user: user dict as kept by pydle, updated in place
+    :param warm: the user's snapshot
+    """
+    for field in WARM_USER_FIELDS:
+        if user.get(field) is None and warm.get(field) is not None:
+            user[field] = warm[field]
+
+
+class Snapshotter(object):
+    """
+    Periodically snapshots a bot's state to disk
+
+    The state is collected and serialized on the event loop one section at a time, yielding to
+    other tasks in between, the file is written and synced from the default executor.
+    """
+
+    def __init__(self, bot, path: str = None, interval: float = None):
+        """
+        :param bot: bot to snapshot, see `chunks()`
+        :param path: snapshot file, defaults to `config.Snapshot.path`
+        :param interval: seconds between snapshots, defaults to `config.Snapshot.interval`
+        """
+        self.bot = bot
+        self.path = path or config.Snapshot.path
+        self.interval = interval or config.Snapshot.interval
+
+    async def save(self) -> int:
+        """
+        Take a snapshot
+        :return: size of the snapshot in bytes
+        """
+        parts = []
+        sections = chunks(self.bot)
+        while True:
+            with Metrics.timer("snapshot.section"):
+                part = next(sections, None)
+            if part is None:
+                break
+            parts.append(part)
+            # serializing everything at once stalls the loop for too long
+            await asyncio.sleep(0)
+        data = b"".join(parts)
+        with Metrics.timer("snapshot.write"):
+            await asyncio.get_event_loop().run_in_executor(None, write, self.path, data)
+        return len(data)
+
+    def save_now(self) -> int:
+        """Take a snapshot without an event loop, e.g. while shutting down."""
+        data = b"".join(chunks(self.bot))
+        write(self.path, data)
+        return len(data)
+
+    async def run(self) -> None:
+        """Take a snapshot every `interval` seconds, forever."""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.save()
+            except OSError as ex:
+                log.error(f"unable to write snapshot {self.path}: {ex!r}")
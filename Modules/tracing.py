@@ -0,0 +1,171 @@
+"""
+tracing.py - Per-invocation tracing of commands
+
+Copyright (c) 2018 The Fuel Rats Mischief,
+All rights reserved.
+
+Licensed under the BSD 3-Clause License.
+
+See LICENSE.md
+
+This module is built on top of the Pydle system.
+
+"""
+from contextlib import contextmanager
+import contextvars
+import itertools
+import random
+import secrets
+import time
+
+from Modules.metrics import Metrics
+import config
+
+####
+# span the current task is in, child spans attach to it
+current_span = contextvars.ContextVar("current_span", default=None)
+
+_span_ids = itertools.count(1)
+
+
+class Trace(object):
+    """The spans of a single invocation, identified by its correlation ID."""
+    __slots__ = ("correlation_id", "sampled", "recording", "spans")
+
+    def __init__(self, sampled: bool, recording: bool):
+        """
+        :param sampled: whether the trace is exported regardless of its duration
+        :param recording: whether spans are kept at all
+        """
+        self.correlation_id = secrets.token_hex(8)
+        self.sampled = sampled
+        self.recording = recording
+        self.spans = []
+
+
+class Span(object):
+    """A timed step of a trace."""
+    __slots__ = ("trace", "span_id", "parent_id", "name", "start", "duration", "attributes",
+                 "_started")
+
+    def __init__(self, trace: Trace, name: str, parent_id: int = None, attributes: dict = None):
+        self.trace = trace
+        self.span_id = next(_span_ids)
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.time()
+        self.duration = None
+        self.attributes = attributes or {}
+        self._started = time.perf_counter()
+
+    def finish(self) -> None:
+        self.duration = time.perf_counter() - self._started
+
+    def as_dict(self) -> dict:
+        return dict(self.attributes, trace=self.trace.correlation_id, span=self.span_id,
+                    parent=self.parent_id, name=self.name, start=self.start,
+                    duration=self.duration)
+
+
+class Tracer(object):
+    """
+    Starts traces and hands finished ones to an exporter
+
+    Only a `sample_rate` fraction of traces is exported, the others don't record any spans. With a
+    `slow_threshold`, every trace records its spans and ones at least that slow are exported as
+    well, so a single slow invocation can be explained even if it wasn't sampled. That makes
+    every trace pay for its spans though, which is why it is off by default.
+    """
+
+    def __init__(self, exporter, sample_rate: float = None, slow_threshold: float = None):
+        """
+        :param exporter: object with a `record(**fields)` method, e.g. an `AuditLog`, called once
+            per span
+        :param sample_rate: fraction of traces exported, defaults to `config.Tracing.sample_rate`
+        :param slow_threshold: seconds after which a trace is always exported, defaults to
+            `config.Tracing.slow_threshold`
+        """
+        self.exporter = exporter
+        self.sample_rate = sample_rate if sample_rate is not None \
+            else config.Tracing.sample_rate
+        self.slow_threshold = slow_threshold if slow_threshold is not None \
+            else config.Tracing.slow_threshold
+
+    def new_trace(self) -> Trace:
+        sampled = random.random() < self.sample_rate
+        return Trace(sampled, sampled or self.slow_threshold is not None)
+
+    def finish(self, trace: Trace, root: Span) -> None:
+        """Export a finished trace if it was sampled or slow."""
+        if not trace.recording:
+            return
+        if not trace.sampled and root.duration < self.slow_threshold:
+            return
+        Metrics.increment("tracing.exported")
+        for span in trace.spans:
+            self.exporter.record(**span.as_dict())
+
+
+####
+# the tracer in use, `None` disables tracing
+tracer = None
+
+
+@contextmanager
+def trace(name: str, **attributes):
+    """
+    Start a new trace with a root span, if tracing is enabled
+    :param name: root span name
+    :param attributes: JSON serializable values exported with the span
+    :return: context manager yielding the root `Span`, or None if nothing is recorded
+    """
+    if tracer is None:
+        yield None
+        return
+
+    new_trace = tracer.new_trace()
+    root = Span(new_trace, name, attributes=attributes)
+    if new_trace.recording:
+        new_trace.spans.append(root)
+    token = current_span.set(root)
+    try:
+        yield root if new_trace.recording else None
+    except BaseException as ex:
+        root.attributes["error"] = repr(ex)
+        raise
+    finally:
+        current_span.reset(token)
+        root.finish()
+        tracer.finish(new_trace, root)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Time a step of the current trace
+    :param name: span name
+    :param attributes: JSON serializable values exported with the span
+    :return: context manager yielding the `Span`, or None if the current trace isn't recorded
+    """
+    parent = current_span.get()
+    if parent is None or not parent.trace.recording:
+        yield None
+        return
+
+    child = Span(parent.trace, name, parent.span_id, attributes)
+    parent.trace.spans.append(child)
+    token = current_span.set(child)
+    try:
+        yield child
+    except BaseException as ex:
+        child.attributes["error"] = repr(ex)
+        raise
+    finally:
+        current_span.reset(token)
+        child.finish()
+
+
+def correlation_id() -> str or None:
+    """Correlation ID of the current trace, None outside of traces."""
+    parent = current_span.get()
+    return parent.trace.correlation_id if parent is not None else None
@@ -1,5 +1,11 @@
+from contextlib import contextmanager
+
 import pydle
 
+from Modules.broadcast import broadcast
+from Modules.reply_buffer import ReplyBuffer
+from Modules import tracing
+
 
 class Trigger(object):
     """Object to hold information on the user who invoked a command (and where they did it)."""
@@ -15,6 +21,9 @@ class Trigger(object):
         self.away = away
         self.account = account
         self.identified = identified
+        self._buffer = None
+        # ties log messages and traces of the same invocation together, None if not traced
+        self.correlation_id = tracing.correlation_id()
 
     @classmethod
     def from_bot_user(cls, bot: pydle.BasicClient, nickname: str, target: str):
@@ -33,6 +42,40 @@ class Trigger(object):
     def channel(self):
         return self.target if self.bot.is_channel(self.target) else None
 
+    @property
+    def reply_target(self):
+        """Where replies go: the channel the command was sent in, or the sender for queries."""
+        return self.channel if self.channel else self.nickname
+
+    @contextmanager
+    def buffered(self):
+        """
+        Collect replies instead of sending them right away.
+
+        Call `flush()` on the yielded `ReplyBuffer` to send the coalesced replies once the
+        command is done.
+        """
+        self._buffer = ReplyBuffer(self.bot, self.reply_target)
+        try:
+            yield self._buffer
+        finally:
+            self._buffer = None
+
     async def reply(self, msg: str):
         """Sends a message in the same channel or query window as the command was sent."""
-        await self.bot.message(self.channel if self.channel else self.nickname, msg)
+        with tracing.span("reply", length=len(msg), buffered=self._buffer is not None):
+            if self._buffer is not None:
+                self._buffer.add(msg)
+            else:
+                buffer = ReplyBuffer(self.bot, self.reply_target)
+                buffer.add(msg)
+                await buffer.flush()
+
+    async def broadcast(self, targets: list, msg: str) -> int:
+        """
+        Sends a message to several channels or nicknames at once, in as few lines as the server
+        allows. Unlike replies, broadcasts are sent right away.
+        :return: number of lines sent
+        """
+        with tracing.span("broadcast", targets=len(targets), length=len(msg)):
+            return await broadcast(self.bot, targets, msg)
@@ -0,0 +1,142 @@
+"""
+user_index.py - IRC casemapping aware nickname lookups
+
+Copyright (c) 2018 The Fuel Rats Mischief,
+All rights reserved.
+
+Licensed under the BSD 3-Clause License.
+
+See LICENSE.md
+
+This module is built on top of the Pydle system.
+
+"""
+from collections.abc import MutableMapping
+import string
+
+####
+# translation tables for the case mappings a server can advertise via ISUPPORT CASEMAPPING.
+# rfc1459 considers []\~ to be the uppercase versions of {}|^
+CASE_MAPPINGS = {
+    "ascii": str.maketrans(string.ascii_uppercase, string.ascii_lowercase),
+    "rfc1459": str.maketrans(string.ascii_uppercase + "[]\\~", string.ascii_lowercase + "{}|^"),
+    "strict-rfc1459": str.maketrans(string.ascii_uppercase + "[]\\",
+                                    string.ascii_lowercase + "{}|"),
+}
+
+DEFAULT_CASE_MAPPING = "rfc1459"
+
+
+def casefold(name: str, case_mapping: str = DEFAULT_CASE_MAPPING) -> str:
+    """
+    Normalize a nickname or channel name for comparisons
+    :param name: name to normalize
+    :param case_mapping: one of `CASE_MAPPINGS`
+    :return: normalized name
+    """
+    return name.translate(CASE_MAPPINGS[case_mapping])
+
+
+def supported_case_mapping(case_mapping: str or None) -> str:
+    """
+    The case mapping to index users with for a server's ISUPPORT CASEMAPPING
+    :param case_mapping: advertised case mapping, None if the server didn't advertise one
+    :return: `case_mapping` if it is one of `CASE_MAPPINGS`, the default otherwise
+    """
+    return case_mapping if case_mapping in CASE_MAPPINGS else DEFAULT_CASE_MAPPING
+
+
+def rename_case_only(users: 'UserIndex', channels: dict, old: str, new: str,
+                     statuses=()) -> bool:
+    """
+    Apply a nickname change that only changes case (as the server compares nicknames)
+
+    Pydle renames by storing the user under the new nickname and deleting the old one, which for
+    an index both nicknames map to deletes the user. Callers hand everything else to pydle.
+    :param users: index of users
+    :param channels: pydle's channel name -> channel dict mapping
+    :param old: current nickname
+    :param new: new nickname
+    :param statuses: channel modes holding nickname lists, e.g. `v` and `o`
+    :return: whether the change was case-only and has been applied
+    """
+    if old not in users or users.casefold(old) != users.casefold(new):
+        return False
+    users.rename(old, new)
+    users[new]["nickname"] = new
+    for channel in channels.values():
+        if old in channel["users"]:
+            channel["users"].discard(old)
+            channel["users"].add(new)
+        for status in statuses:
+            if old in channel["modes"].get(status, ()):
+                channel["modes"][status].remove(old)
+                channel["modes"][status].append(new)
+    return True
+
+
+class UserIndex(MutableMapping):
+    """
+    Mapping of nicknames to user dicts, compared the way the IRC server compares them
+
+    Keys are folded once when stored, lookups only fold the requested nickname, so
+    `index["Client[PC]"]` and `index["client{pc}"]` find the same user. Iterating yields the
+    nicknames as they were stored. Pydle keeps its `users` attribute in sync on NICK and QUIT
+    through item assignment and deletion, so using an index as `users` keeps it current.
+    """
+
+    def __init__(self, users: dict = None, case_mapping: str = DEFAULT_CASE_MAPPING):
+        """
+        :param users: initial nickname -> user mapping
+        :param case_mapping: one of `CASE_MAPPINGS`
+        """
+        if case_mapping not in CASE_MAPPINGS:
+            raise ValueError(f"unknown case mapping {case_mapping}")
+        self.case_mapping = case_mapping
+        self._table = CASE_MAPPINGS[case_mapping]
+        # folded nickname -> (nickname, user)
+        self._users = {}
+        if users:
+            self.update(users)
+
+    def casefold(self, nickname: str) -> str:
+        """Normalize a nickname using this index' case mapping."""
+        return nickname.translate(self._table)
+
+    def __getitem__(self, nickname: str):
+        return self._users[nickname.translate(self._table)][1]
+
+    def __setitem__(self, nickname: str, user):
+        self._users[nickname.translate(self._table)] = (nickname, user)
+
+    def __delitem__(self, nickname: str):
+        del self._users[nickname.translate(self._table)]
+
+    def __contains__(self, nickname) -> bool:
+        return isinstance(nickname, str) and nickname.translate(self._table) in self._users
+
+    def __iter__(self):
+        return (nickname for nickname, user in self._users.values())
+
+    def __len__(self):
+        return len(self._users)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self)!r}, case_mapping={self.case_mapping!r})"
+
+    def nickname(self, nickname: str) -> str:
+        """
+        The stored spelling of a nickname
+        :param nickname: nickname in any case
+        :return: nickname as stored
+        """
+        return self._users[nickname.translate(self._table)][0]
+
+    def rename(self, old: str, new: str) -> None:
+        """
+        Move a user to a new nickname
+        :param old: current nickname
+        :param new: new nickname
+        """
+        user = self._users.pop(old.translate(self._table))[1]
+        self[new] = user
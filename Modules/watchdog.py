@@ -0,0 +1,187 @@
+"""
+watchdog.py - Event loop lag measurement and stall attribution
+
+Copyright (c) 2018 The Fuel Rats Mischief,
+All rights reserved.
+
+Licensed under the BSD 3-Clause License.
+
+See LICENSE.md
+
+This module is built on top of the Pydle system.
+
+"""
+import asyncio
+from collections import deque
+from contextlib import contextmanager
+from itertools import count
+import logging
+import time
+import weakref
+
+from Modules.metrics import Metrics
+import config
+
+
+def _current_task() -> asyncio.Task or None:
+    try:
+        return asyncio.current_task()
+    except RuntimeError:
+        # no running loop
+        return None
+
+
+def _slow_task() -> asyncio.Task or None:
+    """The task whose step asyncio is reporting as slow, None if it wasn't a task."""
+    # asyncio logs the warning before it resets the handle it just ran
+    handle = getattr(asyncio.get_event_loop(), "_current_handle", None)
+    task = getattr(getattr(handle, "_callback", None), "__self__", None)
+    return task if isinstance(task, asyncio.Task) else None
+
+
+class _SlowCallbackHandler(logging.Handler):
+    """Counts the slow callback warnings asyncio logs in debug mode and attributes them."""
+
+    def emit(self, record: logging.LogRecord):
+        if "took" not in record.getMessage():
+            return
+        Metrics.increment("loop.slow_callbacks")
+        duration = record.args[-1] if isinstance(record.args, tuple) and record.args else 0.0
+        culprits = Watchdog.ran_in(_slow_task(), time.perf_counter() - duration)
+        for name in culprits:
+            Metrics.increment(f"loop.slow_callbacks.{name}")
+        Watchdog.log.warning(f"slow callback while running "
+                             f"{', '.join(culprits) or 'nothing known'}: {record.getMessage()}")
+
+
+class Watchdog:
+    """
+    Measures how late the event loop wakes up a sleeping task
+
+    Since everything runs on one loop, a late wakeup means something blocked it. Samples go into
+    the `loop.lag` timing; lags above `config.Watchdog.threshold` count as stalls and are blamed on
+    whatever activities (commands, event handlers, ...) overlapped them. Slow callbacks reported by
+    asyncio are blamed on the activities of the task that actually ran.
+    """
+
+    ####
+    # logger facility
+    log = logging.getLogger(f"{config.Logging.base_logger}.watchdog")
+    ####
+    # token -> (name, start, task) of activities currently running, `task` is a weak reference to
+    # the task the activity runs in (or None)
+    _active = {}
+    ####
+    # (name, start, end, task) of recently finished activities
+    _recent = deque(maxlen=64)
+    _tokens = count()
+    ####
+    # the measuring task, if started
+    _task = None
+    _handler = None
+
+    @classmethod
+    @contextmanager
+    def activity(cls, name: str):
+        """
+        Mark the body as work stalls can be attributed to
+        :param name: activity name, e.g. `command.ping`
+        """
+        token = next(cls._tokens)
+        start = time.perf_counter()
+        task = _current_task()
+        task = weakref.ref(task) if task is not None else None
+        cls._active[token] = (name, start, task)
+        try:
+            yield
+        finally:
+            del cls._active[token]
+            cls._recent.append((name, start, time.perf_counter(), task))
+
+    @classmethod
+    def running(cls) -> list:
+        """Names of the activities currently running, including suspended ones."""
+        return [name for name, start, task in cls._active.values()]
+
+    @classmethod
+    def ran_in(cls, task: asyncio.Task or None, since: float) -> list:
+        """
+        Activities of a task that ran at some point since `since` (a `time.perf_counter()` value)
+        :param task: task to look for, None finds nothing
+        :return: list of names, without duplicates
+        """
+        if task is None:
+            return []
+        names = [name for name, start, ref in cls._active.values()
+                 if ref is not None and ref() is task]
+        names += [name for name, start, end, ref in cls._recent
+                  if end >= since and ref is not None and ref() is task]
+        return list(dict.fromkeys(names))
+
+    @classmethod
+    def culprits(cls, since: float) -> list:
+        """
+        Activities that ran at some point since `since` (a `time.perf_counter()` value)
+        :return: list of names, without duplicates
+        """
+        names = [name for name, start, task in cls._active.values()]
+        names += [name for name, start, end, task in cls._recent if end >= since]
+        return list(dict.fromkeys(names))
+
+    @classmethod
+    def check(cls, lag: float, since: float) -> None:
+        """
+        Record a lag measurement, reporting it as a stall if it exceeds the threshold
+        :param lag: how late the loop was, in seconds
+        :param since: `time.perf_counter()` value when the measured sleep started
+        """
+        Metrics.observe("loop.lag", lag)
+        if lag < config.Watchdog.threshold:
+            return
+
+        culprits = cls.culprits(since)
+        Metrics.increment("loop.stalls")
+        for name in culprits:
+            Metrics.increment(f"loop.stalls.{name}")
+        cls.log.warning(f"event loop stalled for {lag * 1000:.0f}ms while running "
+                        f"{', '.join(culprits) or 'nothing known'}")
+
+    @classmethod
+    async def _watch(cls, interval: float) -> None:
+        while True:
+            since = time.perf_counter()
+            await asyncio.sleep(interval)
+            cls.check(max(0.0, time.perf_counter() - since - interval), since)
+
+    @classmethod
+    def start(cls, loop: asyncio.AbstractEventLoop = None) -> None:
+        """
+        Start measuring, and enable asyncio's slow callback detection if configured
+        :param loop: loop to watch, defaults to the current one
+        """
+        if cls._task is not None:
+            return
+        loop = loop or asyncio.get_event_loop()
+        if config.Watchdog.slow_callbacks:
+            loop.set_debug(True)
+            loop.slow_callback_duration = config.Watchdog.threshold
+            cls._handler = _SlowCallbackHandler()
+            logging.getLogger("asyncio").addHandler(cls._handler)
+        cls._task = loop.create_task(cls._watch(config.Watchdog.interval))
+        cls.log.debug("watchdog started")
+
+    @classmethod
+    async def stop(cls) -> None:
+        """Stop measuring."""
+        if cls._handler is not None:
+            logging.getLogger("asyncio").removeHandler(cls._handler)
+            cls._handler = None
+        task, cls._task = cls._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    @classmethod
+    def lag_percentiles(cls) -> dict:
+        """Percentiles of the recorded loop lag, see `Metrics.percentiles`."""
+        return Metrics.percentiles("loop.lag")
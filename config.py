@@ -34,6 +34,13 @@ class IRC:
     ####
     # what channels to connect to
     channels = ["#unkn0wndev"]
+    ####
+    # maximum length of a raw IRC line, in bytes (including the trailing CRLF)
+    line_length = 512
+    ####
+    # bytes reserved for our own ident and hostname when computing how much text fits into a line
+    max_ident_length = 10
+    max_host_length = 63
 
     class Authentication:
         """
@@ -62,3 +69,152 @@ class Commands:
     ####
     # Mecha's trigger prefix
     trigger = "!"
+    ####
+    # joins consecutive replies of a command that get merged onto one line
+    reply_separator = " | "
+    ####
+    # seconds a command may run before it is cancelled, None to wait forever
+    timeout = 30
+    ####
+    # reply sent when a command is cancelled for exceeding its timeout
+    timeout_message = "Sorry, that took too long and was cancelled."
+
+
+class Scheduler:
+    """
+    Priority lane configuration
+    """
+    ####
+    # picks per round for the emergency, dispatch and normal lanes
+    weights = (8, 4, 1)
+    ####
+    # messages containing any of these (lowercase) go into the emergency lane
+    emergency_keywords = ["ratsignal"]
+    ####
+    # commands that go into the dispatch lane
+    dispatch_commands = ["assign", "go", "unassign", "inject", "close", "clear", "active", "cmdr",
+                         "sys", "pc", "xb", "ps", "cr", "grab", "quote"]
+    ####
+    # number of inbound messages processed concurrently
+    inbound_workers = 4
+
+
+class History:
+    """
+    Message history configuration
+    """
+    ####
+    # most recent lines kept per channel and per nickname
+    channel_lines = 100
+    nickname_lines = 20
+    ####
+    # channels and nicknames tracked before the least recently active ones are forgotten
+    max_channels = 500
+    max_nicknames = 10000
+
+
+class Watchdog:
+    """
+    Event loop watchdog configuration
+    """
+    ####
+    # seconds between loop lag measurements
+    interval = 0.5
+    ####
+    # lag (and callback duration) in seconds above which the loop counts as stalled
+    threshold = 0.1
+    ####
+    # enable asyncio debug mode to report individual slow callbacks. Debug mode slows the whole
+    # bot down, so only turn this on while hunting for what blocks the loop
+    slow_callbacks = False
+
+
+class Audit:
+    """
+    Audit log configuration
+    """
+    ####
+    # file gated command invocations are recorded in
+    log_file = "logs/audit.jsonl"
+    ####
+    # records waiting before an early flush, and seconds between regular flushes
+    batch_size = 100
+    flush_interval = 1.0
+    ####
+    # minimum seconds between fsyncs
+    fsync_interval = 5.0
+    ####
+    # rotate once the file is this large (bytes), keeping this many old files
+    max_bytes = 10 * 1024 * 1024
+    backups = 5
+    ####
+    # records kept in memory while they can't be written, the oldest are dropped beyond this
+    max_records = 10000
+
+
+class Facts:
+    """
+    Facts database configuration
+    """
+    ####
+    # SQLite database holding the facts, None to disable facts
+    database = "facts.sqlite"
+    ####
+    # language used by facts invoked without one (`!prep` rather than `!prep-de`)
+    default_language = "en"
+    ####
+    # seconds between checks for changed facts
+    refresh_interval = 60
+
+
+class Sync:
+    """
+    Rescue synchronization configuration
+    """
+    ####
+    # seconds between synchronizations with the backend
+    interval = 5.0
+    ####
+    # maximum rescue deltas sent in one request
+    batch_size = 50
+
+
+class Snapshot:
+    """
+    State snapshot configuration
+    """
+    ####
+    # file the bot's state is saved to and warm-started from, None disables snapshots
+    path = "snapshot.pickle"
+    ####
+    # seconds between snapshots
+    interval = 60
+    ####
+    # snapshots older than this many seconds are ignored on start
+    max_age = 6 * 60 * 60
+
+
+class Tracing:
+    """
+    Command tracing configuration
+    """
+    ####
+    # file traces are written to, None disables tracing
+    log_file = "logs/traces.jsonl"
+    ####
+    # fraction of command invocations traced
+    sample_rate = 0.01
+    ####
+    # invocations taking at least this many seconds are written even if they weren't sampled.
+    # Setting it makes every invocation record its spans, close to doubling the tracing cost of
+    # each command. None writes sampled invocations only, and skips recording spans for the rest
+    slow_threshold = None
+
+
+class Metrics:
+    """
+    Runtime statistics configuration
+    """
+    ####
+    # number of most recent samples kept per timing
+    samples = 1000
@@ -11,10 +11,23 @@ See LICENSE.md
 This module is built on top of the Pydle system.
 
 """
+import asyncio
+import time
+
 from pydle import ClientPool, Client
+from Modules import audit, broadcast, snapshot, tracing
 from Modules.rat_command import Commands
+from Modules.events import Events
+from Modules.facts import FactsDatabase
+from Modules.history import History
+from Modules.rescue import RescueBoard
+from Modules.keywords import Keywords
+from Modules.metrics import Metrics
+from Modules.user_index import UserIndex, casefold, rename_case_only, supported_case_mapping
+from Modules.scheduler import LaneScheduler, Lane, classify, current_job
+from Modules.watchdog import Watchdog
 import logging
-from config import IRC, Logging
+from config import IRC, Logging, Scheduler, Audit, Facts, Snapshot, Tracing
 
 ##########
 # setup logging stuff
@@ -52,22 +65,177 @@ class MechaClient(Client):
 
     version = "3.0a"
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # inbound messages and outbound replies are processed in priority lanes
+        self.inbound = LaneScheduler("inbound", concurrency=Scheduler.inbound_workers)
+        self.outbound = LaneScheduler("outbound")
+        # recent channel messages, for commands that need context
+        self.history = History()
+        # the rescues we know about
+        self.board = RescueBoard()
+        # canned fact replies, registered as commands
+        self.facts = None
+        self._facts_watcher = None
+        if Facts.database:
+            self.facts = FactsDatabase(Facts.database)
+            self.facts.load()
+            self.facts.register()
+        # state restored by `warm_start()`, users and channels are reconciled with the server's
+        self.warm_users = UserIndex()
+        self.warm_channels = []
+        self._warm = False
+        self.snapshots = snapshot.Snapshotter(self) if Snapshot.path else None
+        self._snapshotter = None
+        self._created = time.perf_counter()
+        self._ready = False
+
+    def warm_start(self) -> bool:
+        """
+        Restore state from the last snapshot, if there is a recent one. Call before connecting.
+        :return: whether a snapshot was restored
+        """
+        if self.snapshots is None:
+            return False
+        started = time.perf_counter()
+        try:
+            state = snapshot.read(self.snapshots.path)
+        except snapshot.SnapshotException as ex:
+            log.error(f"{ex}, starting cold: {ex.__cause__!r}")
+            return False
+        if state is None:
+            return False
+        snapshot.restore(self, state)
+        Metrics.observe("startup.restore", time.perf_counter() - started)
+        self._warm = True
+        return True
+
+    def _reset_attributes(self):
+        super()._reset_attributes()
+        # look users up the way the server compares nicknames
+        self.users = UserIndex(self.users, case_mapping=self._user_case_mapping())
+
+    def _user_case_mapping(self) -> str:
+        return supported_case_mapping(getattr(self, "_case_mapping", None))
+
+    async def on_isupport_casemapping(self, value):
+        """
+        Triggered when the server advertises how it compares nicknames
+        :param value: case mapping name
+        """
+        await super().on_isupport_casemapping(value)
+        # pydle replaced the index with a dict of its own, index the users again
+        self.users = UserIndex(self.users, case_mapping=self._user_case_mapping())
+
+    async def on_isupport_targmax(self, value):
+        """
+        Triggered when the server advertises how many targets commands accept
+        :param value: TARGMAX value
+        """
+        await super().on_isupport_targmax(value)
+        # keep the unlimited ones pydle skips, so broadcasts know they can join every target
+        self._target_limits.update(broadcast.parse_targmax(value))
+
+    async def _sync_user(self, nick, metadata):
+        warm = self.warm_users.pop(nick, None) if nick not in self.users else None
+        await super()._sync_user(nick, metadata)
+        if warm is not None and nick in self.users:
+            # the server's data wins, the snapshot only fills in what it hasn't sent (yet)
+            snapshot.warm_user(self.users[nick], warm)
+
+    async def _rename_user(self, user, new):
+        # a case-only change keeps the same index entry, pydle's rename would delete it
+        if not rename_case_only(self.users, self.channels, user, new,
+                                self._nickname_prefixes.values()):
+            await super()._rename_user(user, new)
+
+    async def message(self, target, message):
+        """
+        Sends a message through the outbound lanes, inheriting the lane of the inbound message
+        currently being handled (if any).
+        :param target: channel or nickname to send to
+        :param message: message body
+        """
+        job = current_job.get()
+        lane = job.lane if job is not None else Lane.NORMAL
+        await self.outbound.submit(lane, super().message, target, message, _parent=job)
+
     async def on_connect(self):
         """
         Called upon connection to the IRC server
         :return:
         """
         log.debug("on connect invoked")
-        # join a channel
-        for channel in IRC.channels:
+        # keep an eye on the event loop
+        Watchdog.start()
+        if self.facts is not None and self._facts_watcher is None:
+            self._facts_watcher = asyncio.ensure_future(self.facts.watch())
+        if self.snapshots is not None and self._snapshotter is None:
+            self._snapshotter = asyncio.ensure_future(self.snapshots.run())
+        # join the configured channels, and any other channel we were in before a warm start
+        channels = list(IRC.channels)
+        configured = {casefold(channel) for channel in channels}
+        channels += [channel for channel in self.warm_channels
+                     if casefold(channel) not in configured]
+        for channel in channels:
             await self.join(channel)
 
         log.debug("joined channels.")
+        if not self._ready:
+            self._ready = True
+            elapsed = time.perf_counter() - self._created
+            Metrics.observe(f"startup.ready.{'warm' if self._warm else 'cold'}", elapsed)
+            log.info(f"ready {elapsed:.2f}s after start ({'warm' if self._warm else 'cold'})")
         # call the super
         super().on_connect()
-    #
-    # def on_join(self, channel, user):
-    #     super().on_join(channel, user)
+
+    async def on_join(self, channel, user):
+        """
+        Triggered when a user, possibly the bot, joins a channel
+        :param channel: channel that was joined
+        :param user: user that joined
+        """
+        await super().on_join(channel, user)
+        await Events.dispatch("join", channel=channel, nickname=user)
+
+    async def on_part(self, channel, user, message=None):
+        """
+        Triggered when a user, possibly the bot, leaves a channel
+        :param channel: channel that was left
+        :param user: user that left
+        :param message: part message, if any
+        """
+        await super().on_part(channel, user, message)
+        await Events.dispatch("part", channel=channel, nickname=user, message=message)
+
+    async def on_nick_change(self, old, new):
+        """
+        Triggered when a user, possibly the bot, changes nickname
+        :param old: previous nickname
+        :param new: new nickname
+        """
+        await super().on_nick_change(old, new)
+        await Events.dispatch("nick", nickname=old, new=new)
+
+    async def on_quit(self, user, message=None):
+        """
+        Triggered when a user, possibly the bot, disconnects from the network
+        :param user: user that quit
+        :param message: quit message, if any
+        """
+        await super().on_quit(user, message)
+        await Events.dispatch("quit", nickname=user, message=message)
+
+    async def on_kick(self, channel, target, by, reason=None):
+        """
+        Triggered when a user, possibly the bot, is kicked from a channel
+        :param channel: channel the user was kicked from
+        :param target: user that was kicked
+        :param by: user that did the kicking
+        :param reason: kick reason, if any
+        """
+        await super().on_kick(channel, target, by, reason)
+        await Events.dispatch("kick", channel=channel, nickname=target, by=by, reason=reason)
 
     async def on_message(self, channel, user, message):
         """
@@ -83,8 +251,19 @@ class MechaClient(Client):
             log.debug("received message from myself ignoring!.")
             return None
 
-        else:  # await command execution
-            await Commands.trigger(message=message, sender=user, channel=channel)
+        if self.is_channel(channel):
+            self.history.record(channel, user, message)
+
+        if message.startswith(Commands.prefix):  # queue command execution by priority
+            lane = classify(message)
+            # dispatch commands build on each other, run them in the order they were given
+            self.inbound.submit(lane, Commands.trigger, message=message, sender=user,
+                                channel=channel, _key=channel if lane == Lane.DISPATCH else None)
+        else:  # ordinary chatter, look for keywords
+            hits = Keywords.scan(message)
+            if hits:
+                self.inbound.submit(classify(message), Keywords.dispatch, hits,
+                                    sender=user, channel=channel)
 
 
 @Commands.command("ping")
@@ -108,6 +287,7 @@ if __name__ == "__main__":
     try:
         log.debug("spawning new bot instance...")
         client = MechaClient(IRC.presence)
+        client.warm_start()
 
         log.info(f"connecting to {IRC.server}:{IRC.port}")
         pool.connect(client, IRC.server, IRC.port, tls=IRC.tls)
@@ -119,6 +299,24 @@ if __name__ == "__main__":
     else:
         # hand the bot instance to commands
         Commands.bot = client
+        Events.bot = client
+        Keywords.bot = client
+        # record gated commands
+        audit.sink = audit.AuditLog(Audit.log_file)
+        audit.sink.start()
+        # trace a sample of command invocations, and every slow one if configured to
+        if Tracing.log_file:
+            tracing.tracer = tracing.Tracer(audit.AuditLog(Tracing.log_file))
+            tracing.tracer.exporter.start()
         # and run the event loop
         log.info("running forever...")
-        pool.handle_forever()
+        try:
+            pool.handle_forever()
+        finally:
+            # write out whatever audit records and traces are still waiting
+            audit.sink.stop()
+            if tracing.tracer is not None:
+                tracing.tracer.exporter.stop()
+            # leave a fresh snapshot behind for the next start
+            if client.snapshots is not None:
+                client.snapshots.save_now()
@@ -1,9 +1,12 @@
+from Modules.user_index import UserIndex
+
+
 class MockBot(object):
     """Emulates some of the bots functions for testing purposes."""
     def __init__(self):
         self.sent_messages = []
 
-        self.users = {
+        self.users = UserIndex({
             "unit_test[BOT]": {
                 "nickname": "unit_test[BOT]",
                 "username": "unit_test",
@@ -58,7 +61,7 @@ class MockBot(object):
                 "account": None,
                 "identified": False
             }
-        }
+        })
 
     async def message(self, target: str, message: str):
         self.sent_messages.append({
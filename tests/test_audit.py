@@ -0,0 +1,167 @@
+"""
+test_audit.py
+
+Tests for the audit module
+
+Copyright (c) 2018 The Fuel Rats Mischief,
+All rights reserved.
+
+Licensed under the BSD 3-Clause License.
+
+See LICENSE.md
+
+This module is built on top of the Pydle system.
+
+"""
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from aiounittest import async_test
+
+from Modules import audit, permissions
+from Modules.audit import AuditLog
+from Modules.metrics import Metrics
+from Modules.permissions import require_permission
+from Modules.rat_command import Commands
+from tests.mock_bot import MockBot
+
+
+@require_permission(permissions.OVERSEER)
+async def restricted(bot, trigger):
+    await trigger.reply("Restricted command was executed.")
+
+
+class AuditLogTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "logs", "audit.jsonl")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def read(self, path=None) -> list:
+        with open(path or self.path, encoding="utf-8") as file:
+            return [json.loads(line) for line in file]
+
+    def test_flush(self):
+        sink = AuditLog(self.path)
+        sink.record(nickname="some_ov", result="ok")
+        sink.record(nickname="some_recruit", result="denied")
+        self.assertEqual(2, sink.flush())
+        self.assertEqual(0, sink.flush())
+        sink._close()
+
+        records = self.read()
+        self.assertEqual(["some_ov", "some_recruit"], [record["nickname"] for record in records])
+        self.assertIn("time", records[0])
+
+    def test_failed_write_kept(self):
+        """
+        Verifies records that couldn't be written are written by the next flush, in order
+        """
+        sink = AuditLog(self.path)
+        sink.record(nickname="some_ov")
+        with mock.patch.object(sink, "_open", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                sink.flush()
+        sink.record(nickname="some_recruit")
+        self.assertEqual(2, sink.flush())
+        sink._close()
+
+        self.assertEqual(["some_ov", "some_recruit"],
+                         [record["nickname"] for record in self.read()])
+
+    def test_backlog_capped(self):
+        """
+        Verifies records piling up while the log can't be written are capped, oldest dropped first
+        """
+        Metrics._flush()
+        sink = AuditLog(self.path, max_records=3)
+        with mock.patch.object(sink, "_open", side_effect=OSError("disk full")):
+            for batch in range(5):
+                sink.record(batch=batch)
+                with self.assertRaises(OSError):
+                    sink.flush()
+        self.assertEqual(3, sink.flush())
+        sink._close()
+
+        self.assertEqual([2, 3, 4], [record["batch"] for record in self.read()])
+        self.assertEqual(2, Metrics.count("audit.dropped"))
+
+    def test_failed_final_flush(self):
+        """
+        Verifies the file is still closed when the last flush on stopping fails
+        """
+        sink = AuditLog(self.path, flush_interval=60, max_bytes=10)
+        sink.record(nickname="some_ov")
+        sink.flush()
+        sink.start()
+        sink.record(nickname="some_recruit")
+        with mock.patch.object(sink, "_rotate", side_effect=OSError("disk full")):
+            sink.stop()
+        self.assertIsNone(sink._file)
+        self.assertEqual(1, len(sink._records))
+
+    def test_rotation(self):
+        sink = AuditLog(self.path, max_bytes=200, backups=2)
+        for batch in range(6):
+            sink.record(batch=batch, padding="x" * 100)
+            sink.flush()
+        sink._close()
+
+        self.assertEqual([5], [record["batch"] for record in self.read()])
+        self.assertEqual([4], [record["batch"] for record in self.read(f"{self.path}.1")])
+        self.assertEqual([3], [record["batch"] for record in self.read(f"{self.path}.2")])
+        self.assertFalse(os.path.exists(f"{self.path}.3"))
+
+    def test_thread_writes_on_stop(self):
+        sink = AuditLog(self.path, flush_interval=60)
+        sink.start()
+        sink.record(nickname="some_ov")
+        sink.stop()
+        self.assertEqual(1, len(self.read()))
+
+    def test_thread_flushes_full_batch(self):
+        sink = AuditLog(self.path, batch_size=2, flush_interval=60)
+        sink.start()
+        try:
+            sink.record(index=0)
+            sink.record(index=1)
+            for _ in range(100):
+                if not sink._records:
+                    break
+                time.sleep(0.01)
+            self.assertEqual([], sink._records)
+        finally:
+            sink.stop()
+
+
+class AuditedPermissionTests(unittest.TestCase):
+    def setUp(self):
+        Commands._flush()
+        Commands.bot = MockBot()
+        Commands.command("restricted")(restricted)
+        # never started, records stay in memory
+        audit.sink = self.sink = AuditLog(os.devnull)
+
+    def tearDown(self):
+        audit.sink = None
+
+    @async_test
+    async def test_records(self):
+        await Commands.trigger("!restricted now please", "some_ov", "#somechannel")
+        await Commands.trigger("!restricted", "some_recruit", "#somechannel")
+        await Commands.trigger("!restricted", "authorized_but_not_identified", "#somechannel")
+
+        granted, denied, unidentified = self.sink._records
+        self.assertEqual({"nickname": "some_ov", "vhost": "overseer.fuelrats.com", "level": 3,
+                          "required": 3, "command": "restricted", "args": ["now", "please"],
+                          "channel": "#somechannel", "result": "ok"},
+                         {key: granted[key] for key in ["nickname", "vhost", "level", "required",
+                                                        "command", "args", "channel", "result"]})
+        self.assertEqual(("denied", 0), (denied["result"], denied["level"]))
+        self.assertEqual(("denied", None), (unidentified["result"], unidentified["level"]))
@@ -0,0 +1,108 @@
+"""
+test_broadcast.py
+
+Tests for the broadcast module
+
+Copyright (c) 2018 The Fuel Rats Mischief,
+All rights reserved.
+
+Licensed under the BSD 3-Clause License.
+
+See LICENSE.md
+
+This module is built on top of the Pydle system.
+
+"""
+import asyncio
+import math
+import unittest
+
+from aiounittest import async_test
+
+from Modules.broadcast import broadcast, parse_targmax, plan
+from Modules.metrics import Metrics
+from Modules.reply_buffer import line_overhead
+from Modules.trigger import Trigger
+from tests.mock_bot import MockBot
+import config
+
+
+class SlowBot(MockBot):
+    """Takes a moment to send, so broadcasts stay pending."""
+
+    async def message(self, target: str, message: str):
+        await asyncio.sleep(0.01)
+        await super().message(target, message)
+
+
+class BroadcastTests(unittest.TestCase):
+    def setUp(self):
+        Metrics._flush()
+        self.bot = MockBot()
+
+    def sent(self) -> list:
+        return [(sent["target"], sent["message"]) for sent in self.bot.sent_messages]
+
+    @async_test
+    async def test_without_targmax(self):
+        self.assertEqual(2, await broadcast(self.bot, ["#fuelrats", "#ratchat"], "ratsignal"))
+        self.assertEqual([("#fuelrats", "ratsignal"), ("#ratchat", "ratsignal")], self.sent())
+
+    @async_test
+    async def test_targmax(self):
+        self.bot._target_limits = {"PRIVMSG": 2}
+        self.assertEqual(2, await broadcast(self.bot, ["#a", "#b", "#c"], "ratsignal"))
+        self.assertEqual([("#a,#b", "ratsignal"), ("#c", "ratsignal")], self.sent())
+        self.assertEqual(2, Metrics.count("broadcast.lines"))
+
+    def test_parse_targmax(self):
+        self.assertEqual({"PRIVMSG": 4, "NOTICE": math.inf, "JOIN": math.inf},
+                         parse_targmax("PRIVMSG:4,notice:,JOIN:"))
+        self.assertEqual({}, parse_targmax(None))
+
+    @async_test
+    async def test_unlimited_targmax(self):
+        """
+        Verifies a server without a target limit gets every target in one PRIVMSG
+        """
+        self.bot._target_limits = parse_targmax("PRIVMSG:,NOTICE:4")
+        self.assertEqual(1, await broadcast(self.bot, ["#a", "#b", "#c", "#d", "#e"], "ratsignal"))
+        self.assertEqual([("#a,#b,#c,#d,#e", "ratsignal")], self.sent())
+
+    @async_test
+    async def test_duplicate_targets(self):
+        self.bot._target_limits = {"PRIVMSG": 4}
+        await broadcast(self.bot, ["#FuelRats[PC]", "#fuelrats{pc}", "some_rat"], "hi")
+        self.assertEqual([("#FuelRats[PC],some_rat", "hi")], self.sent())
+
+    def test_no_extra_lines(self):
+        """
+        Verifies targets aren't joined when the longer target list would split the message
+        """
+        self.bot._target_limits = {"PRIVMSG": 4}
+        message = "x" * (config.IRC.line_length - line_overhead(self.bot, "#a"))
+        self.assertEqual([("#a", [message]), ("#b", [message])],
+                         plan(self.bot, ["#a", "#b"], message))
+        self.assertEqual([("#a,#b", ["short"])], plan(self.bot, ["#a", "#b"], "short"))
+
+    @async_test
+    async def test_pending_deduplicated(self):
+        self.bot = SlowBot()
+        results = await asyncio.gather(broadcast(self.bot, ["#a", "#b"], "ratsignal"),
+                                       broadcast(self.bot, ["#B", "#a"], "ratsignal"),
+                                       broadcast(self.bot, ["#a"], "ratsignal"))
+        self.assertEqual([2, 0, 1], results)
+        self.assertEqual(3, len(self.bot.sent_messages))
+        self.assertEqual(1, Metrics.count("broadcast.deduplicated"))
+
+        # once sent, the same broadcast goes out again
+        await broadcast(self.bot, ["#a", "#b"], "ratsignal")
+        self.assertEqual(5, len(self.bot.sent_messages))
+
+    @async_test
+    async def test_trigger_broadcast(self):
+        self.bot._target_limits = {"PRIVMSG": 4}
+        trigger = Trigger.from_bot_user(self.bot, "some_ov", "#unit_test")
+        with trigger.buffered():
+            self.assertEqual(1, await trigger.broadcast(["#a", "#b"], "announcement"))
+        self.assertEqual([("#a,#b", "announcement")], self.sent())
@@ -0,0 +1,150 @@
+"""
+test_events.py
+
+Tests for the events module
+
+Copyright (c) 2018 The Fuel Rats Mischief,
+All rights reserved.
+
+Licensed under the BSD 3-Clause License.
+
+See LICENSE.md
+
+This module is built on top of the Pydle system.
+
+"""
+import asyncio
+import unittest
+
+from aiounittest import async_test
+
+from Modules.events import Events, UnknownEventException
+from Modules.metrics import Metrics
+from tests.mock_bot import MockBot
+
+
+class EventsTests(unittest.TestCase):
+    def setUp(self):
+        Events._flush()
+        Metrics._flush()
+        Events.bot = self.bot = MockBot()
+
+    def test_register_unknown_event(self):
+        """
+        Verifies subscribing to an event that is never dispatched is refused
+        """
+        with self.assertRaises(UnknownEventException):
+            @Events.event("potato")
+            async def handler(bot, event):
+                pass
+
+    def test_register_non_callable(self):
+        """
+        Verifies non-callables are not registered
+        """
+        for item in [12, None, "str"]:
+            with self.subTest(item=item):
+                self.assertFalse(Events._register(item, "join"))
+
+    @async_test
+    async def test_dispatch_unfiltered(self):
+        """
+        Verifies an unfiltered handler receives the event and its details
+        """
+        received = []
+
+        @Events.event("part")
+        async def handler(bot, event):
+            received.append((bot, event.channel, event.nickname, event.message))
+
+        await Events.dispatch("part", channel="#unit_testing", nickname="unit_test", message="bye")
+        self.assertEqual([(self.bot, "#unit_testing", "unit_test", "bye")], received)
+
+    @async_test
+    async def test_dispatch_filters(self):
+        """
+        Verifies channel and nickname filters only match their events
+        """
+        received = []
+
+        @Events.event("join", channel="#ratchat")
+        async def channel_handler(bot, event):
+            received.append("channel")
+
+        @Events.event("join", nickname="unit_test")
+        async def nick_handler(bot, event):
+            received.append("nick")
+
+        @Events.event("join", channel="#ratchat", nickname="unit_test")
+        async def both_handler(bot, event):
+            received.append("both")
+
+        cases = [
+            ("#ratchat", "unit_test", {"channel", "nick", "both"}),
+            ("#RatChat", "some_ov", {"channel"}),
+            ("#fuelrats", "Unit_Test", {"nick"}),
+            ("#fuelrats", "some_ov", set()),
+        ]
+        for channel, nickname, expected in cases:
+            with self.subTest(channel=channel, nickname=nickname):
+                received.clear()
+                await Events.dispatch("join", channel=channel, nickname=nickname)
+                self.assertEqual(expected, set(received))
+                self.assertEqual(len(expected), len(received))
+
+    @async_test
+    async def test_dispatch_concurrent(self):
+        """
+        Verifies handlers run concurrently rather than one after the other
+        """
+        started = []
+        both_started = asyncio.Event()
+
+        async def waiter(bot, event):
+            started.append(event.nickname)
+            if len(started) == 2:
+                both_started.set()
+            await asyncio.wait_for(both_started.wait(), 1)
+
+        Events.event("quit")(waiter)
+        Events.event("quit")(waiter)
+
+        await Events.dispatch("quit", nickname="unit_test")
+        self.assertEqual(2, len(started))
+
+    @async_test
+    async def test_dispatch_handler_failure(self):
+        """
+        Verifies a failing handler does not prevent other handlers from running
+        """
+        received = []
+
+        @Events.event("kick")
+        async def broken(bot, event):
+            raise RuntimeError("oops")
+
+        @Events.event("kick")
+        async def working(bot, event):
+            received.append(event.by)
+
+        results = await Events.dispatch("kick", channel="#ratchat", nickname="unit_test",
+                                        by="some_ov")
+        self.assertEqual(["some_ov"], received)
+        self.assertTrue(any(isinstance(result, RuntimeError) for result in results))
+
+    @async_test
+    async def test_dispatch_records_timing(self):
+        """
+        Verifies each handler invocation is timed
+        """
+        @Events.event("nick")
+        async def renamed(bot, event):
+            pass
+
+        await Events.dispatch("nick", nickname="unit_test", new="unit_test_2")
+        self.assertEqual(1, len(Metrics.samples("event.nick.renamed")))
+
+    @async_test
+    async def test_dispatch_unknown_event(self):
+        with self.assertRaises(UnknownEventException):
+            await Events.dispatch("potato")
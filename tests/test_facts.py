@@ -0,0 +1,142 @@
+"""
+test_facts.py
+
+Tests for the facts module
+
+Copyright (c) 2018 The Fuel Rats Mischief,
+All rights reserved.
+
+Licensed under the BSD 3-Clause License.
+
+See LICENSE.md
+
+This module is built on top of the Pydle system.
+
+"""
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from aiounittest import async_test
+
+from Modules.facts import FactsDatabase
+from Modules.rat_command import Commands
+from tests.mock_bot import MockBot
+
+
+class FactsTests(unittest.TestCase):
+    def setUp(self):
+        Commands._flush()
+        Commands.bot = self.bot = MockBot()
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "facts.sqlite")
+
+        self.facts = FactsDatabase(self.path, default_language="en")
+        self.write("prep", "en", "Please drop from supercruise, {nick} will help.", 1)
+        self.write("prep", "de", "Bitte verlasse den Supercruise.", 1)
+        self.write("pcfr", "en", "Send friend requests.", 1)
+        self.write("pc-quit", "en", "Log out to the main menu.", 1)
+        self.facts.load()
+
+    def tearDown(self):
+        self.facts.close()
+        self.directory.cleanup()
+
+    def write(self, name, lang, body, mtime):
+        with sqlite3.connect(self.path) as connection:
+            connection.execute("INSERT OR REPLACE INTO facts (name, lang, body, mtime) "
+                               "VALUES (?, ?, ?, ?)", (name, lang, body, mtime))
+        connection.close()
+
+    def delete(self, name, lang):
+        with sqlite3.connect(self.path) as connection:
+            connection.execute("DELETE FROM facts WHERE name = ? AND lang = ?", (name, lang))
+        connection.close()
+
+    def test_bodies_lazy(self):
+        self.assertEqual(4, len(self.facts))
+        self.assertFalse(any(fact.loaded for fact in self.facts._facts.values()))
+
+        fact = self.facts.get("PCFR")
+        self.assertTrue(fact.loaded)
+        self.assertEqual("Send friend requests.", fact.render())
+        self.assertFalse(self.facts._facts[("prep", "en")].loaded)
+
+    def test_language_fallback(self):
+        self.assertEqual("de", self.facts.get("prep", "de").lang)
+        self.assertEqual("en", self.facts.get("pcfr", "de").lang)
+        self.assertIsNone(self.facts.get("nope"))
+
+    def test_render_placeholders(self):
+        fact = self.facts.get("prep")
+        self.assertEqual("Please drop from supercruise, some_rat will help.",
+                         fact.render(nick="some_rat"))
+        self.assertEqual("Please drop from supercruise, {nick} will help.", fact.render())
+
+    def test_render_literal_braces(self):
+        """
+        Verifies only `{name}` placeholders are filled in, anything else in braces is left as it is
+        """
+        cases = [("Set your filter to {x and {nick}, then }",
+                  "Set your filter to {x and some_rat, then }"),
+                 ("hi {nick} {0}", "hi some_rat {0}"),
+                 ("hi {nick} {}", "hi some_rat {}"),
+                 ("{nick:>q}", "{nick:>q}"),
+                 ("{nick.__class__} {nick[0]}", "{nick.__class__} {nick[0]}"),
+                 ("{{nick}}", "{some_rat}")]
+        # a new modification time for each, so refresh() picks the body up
+        for mtime, (body, expected) in enumerate(cases, start=2):
+            with self.subTest(body=body):
+                self.write("filter", "en", body, mtime)
+                self.facts.refresh()
+                self.assertEqual(expected, self.facts.get("filter").render(nick="some_rat"))
+
+    def test_search(self):
+        self.assertEqual(["pc-quit", "pcfr"], self.facts.search("pc"))
+        self.assertEqual(["prep"], self.facts.search("PR"))
+        self.assertEqual([], self.facts.search("z"))
+
+    def test_refresh(self):
+        self.facts.get("prep")
+        self.facts.get("pcfr")
+        self.write("prep", "en", "Changed.", 2)
+        self.write("beacon", "en", "Turn on your wing beacon.", 1)
+        self.delete("prep", "de")
+
+        added, changed, removed = self.facts.refresh()
+        self.assertEqual({("beacon", "en")}, added)
+        self.assertEqual({("prep", "en")}, changed)
+        self.assertEqual({("prep", "de")}, removed)
+        # unchanged facts keep their body, changed ones are reloaded on next use
+        self.assertTrue(self.facts._facts[("pcfr", "en")].loaded)
+        self.assertEqual("Changed.", self.facts.get("prep").render())
+        self.assertEqual(["beacon"], self.facts.search("b"))
+
+    @async_test
+    async def test_commands(self):
+        self.facts.register()
+        await Commands.trigger("!prep", "unit_test", "#fuelrats")
+        await Commands.trigger("!prep-de some client", "unit_test", "#fuelrats")
+        await Commands.trigger("!pc-quit", "unit_test", "#fuelrats")
+        self.assertEqual([
+            "Please drop from supercruise, unit_test will help.",
+            "some client: Bitte verlasse den Supercruise.",
+            "Log out to the main menu.",
+        ], [sent["message"] for sent in self.bot.sent_messages])
+
+    def test_registration_follows_refresh(self):
+        @Commands.command("pcfr-en")
+        async def collision(bot, trigger):
+            pass
+
+        self.facts.register()
+        self.assertIsNotNone(Commands.get_command("prep-de"))
+        self.assertIs(collision, Commands.get_command("pcfr-en"))
+
+        self.delete("prep", "de")
+        self.write("beacon", "en", "Turn on your wing beacon.", 1)
+        self.facts.refresh()
+        self.assertIsNone(Commands.get_command("prep-de"))
+        self.assertIsNotNone(Commands.get_command("beacon"))
+        self.assertIsNotNone(Commands.get_command("prep"))
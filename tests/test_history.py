@@ -0,0 +1,97 @@
+"""
+test_history.py
+
+Tests for the history module
+
+Copyright (c) 2018 The Fuel Rats Mischief,
+All rights reserved.
+
+Licensed under the BSD 3-Clause License.
+
+See LICENSE.md
+
+This module is built on top of the Pydle system.
+
+"""
+import unittest
+
+from Modules.history import History, RingBuffer
+
+
+class RingBufferTests(unittest.TestCase):
+    def test_partial(self):
+        buffer = RingBuffer(5)
+        for item in range(3):
+            buffer.append(item)
+        self.assertEqual([0, 1, 2], list(buffer))
+        self.assertEqual([2, 1], list(buffer.newest(2)))
+
+    def test_overwrite(self):
+        buffer = RingBuffer(3)
+        for item in range(7):
+            buffer.append(item)
+        self.assertEqual(3, len(buffer))
+        self.assertEqual([4, 5, 6], list(buffer))
+        self.assertEqual([6, 5, 4], list(buffer.newest(10)))
+
+    def test_empty(self):
+        self.assertEqual([], list(RingBuffer(3).newest(2)))
+
+    def test_invalid_capacity(self):
+        with self.assertRaises(ValueError):
+            RingBuffer(0)
+
+
+class HistoryTests(unittest.TestCase):
+    def setUp(self):
+        self.history = History(channel_lines=3, nickname_lines=2, max_channels=2, max_nicknames=2)
+
+    def test_last(self):
+        for index in range(5):
+            self.history.record("#fuelrats", "some_rat", f"line {index}")
+        self.assertEqual(["line 4", "line 3", "line 2"],
+                         [line.message for line in self.history.last("#FuelRats", 10)])
+        self.assertEqual([], self.history.last("#ratchat"))
+
+    def test_last_from(self):
+        self.history.record("#fuelrats", "some_rat", "first")
+        self.history.record("#fuelrats", "Client", "help please")
+        self.history.record("#ratchat", "client", "hello?")
+
+        self.assertEqual(["hello?", "help please"],
+                         [line.message for line in self.history.last_from("CLIENT", 5)])
+        self.assertEqual(["help please"],
+                         [line.message for line in
+                          self.history.last_from("client", 5, "#fuelrats")])
+        self.assertEqual([], self.history.last_from("nobody"))
+
+    def test_lines_shared(self):
+        line = self.history.record("#fuelrats", "client", "help please")
+        self.assertIs(line, self.history.last("#fuelrats")[0])
+        self.assertIs(line, self.history.last_from("client")[0])
+
+    def test_least_recent_evicted(self):
+        self.history.record("#one", "a", "x")
+        self.history.record("#two", "b", "x")
+        self.history.record("#one", "a", "x")
+        self.history.record("#three", "c", "x")
+
+        self.assertEqual(2, self.history.channel_count)
+        self.assertEqual(2, self.history.nickname_count)
+        self.assertEqual([], self.history.last("#two"))
+        self.assertEqual([], self.history.last_from("b"))
+        self.assertEqual(1, len(self.history.last("#one")))
+
+    def test_forget(self):
+        self.history.record("#fuelrats", "client", "help please")
+        self.history.forget("Client")
+        self.assertEqual([], self.history.last_from("client"))
+        self.assertEqual(1, len(self.history.last("#fuelrats")))
+
+    def test_all_lines(self):
+        self.history.record("#ratchat", "a", "first", timestamp=1)
+        self.history.record("#fuelrats", "b", "second", timestamp=2)
+        for index in range(4):
+            self.history.record("#ratchat", "a", f"line {index}", timestamp=3 + index)
+        self.assertEqual(["second", "line 1", "line 2", "line 3"],
+                         [line.message for line in self.history.lines()])
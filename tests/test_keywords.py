@@ -0,0 +1,170 @@
+"""
+test_keywords.py
+
+Tests for the keywords module
+
+Copyright (c) 2018 The Fuel Rats Mischief,
+All rights reserved.
+
+Licensed under the BSD 3-Clause License.
+
+See LICENSE.md
+
+This module is built on top of the Pydle system.
+
+"""
+import unittest
+
+from aiounittest import async_test
+
+from Modules.keywords import Keywords, KeywordException
+from tests.mock_bot import MockBot
+
+
+class KeywordsTests(unittest.TestCase):
+    def setUp(self):
+        Keywords._flush()
+        Keywords.bot = self.bot = MockBot()
+
+    def test_scan_no_keywords(self):
+        self.assertEqual([], Keywords.scan("RATSIGNAL"))
+
+    def test_scan_whole_words(self):
+        """
+        Verifies plain keywords match case-insensitively and only as whole words
+        """
+        @Keywords.keyword("ratsignal")
+        async def signal(bot, trigger, match):
+            pass
+
+        for message, expected in [("RATSIGNAL - CMDR potato", 1), ("a ratsignal!", 1),
+                                  ("ratsignals", 0), ("nothing here", 0), ("", 0)]:
+            with self.subTest(message=message):
+                self.assertEqual(expected, len(Keywords.scan(message)))
+
+    def test_scan_bracketed_nick(self):
+        """
+        Verifies keywords starting or ending with non-word characters are still whole words
+        """
+        @Keywords.keyword("Client[PC]")
+        async def highlight(bot, trigger, match):
+            pass
+
+        for message, expected in [("hi client[pc]", 1), ("client[pc] hi", 1), ("client[pc]:", 1),
+                                  ("@CLIENT[PC], hi", 1), ("xclient[pc]", 0),
+                                  ("client[pc]s", 0)]:
+            with self.subTest(message=message):
+                self.assertEqual(expected, len(Keywords.scan(message)))
+
+    def test_scan_regex_groups(self):
+        """
+        Verifies regex keywords get a match of their own pattern, groups included
+        """
+        @Keywords.keyword(r"(?:case\s*)?#(\d+)", regex=True)
+        async def case_reference(bot, trigger, match):
+            pass
+
+        @Keywords.keyword("fuel")
+        async def fuel(bot, trigger, match):
+            pass
+
+        hits = Keywords.scan("need fuel, see case #12")
+        self.assertEqual({"fuel", "case_reference"}, {handler.__name__ for handler, match in hits})
+        case_match = [match for handler, match in hits if handler.__name__ == "case_reference"][0]
+        self.assertEqual("12", case_match.group(1))
+
+    def test_rebuilt_after_registration(self):
+        @Keywords.keyword("potato")
+        async def potato(bot, trigger, match):
+            pass
+
+        self.assertEqual(1, len(Keywords.scan("potato cannon")))
+
+        @Keywords.keyword("cannon")
+        async def cannon(bot, trigger, match):
+            pass
+
+        self.assertEqual(2, len(Keywords.scan("potato cannon")))
+
+    def test_shared_prefixes(self):
+        """
+        Verifies keywords that are prefixes of one another are told apart
+        """
+        @Keywords.keyword("rat", "ratsignal", "rats", "r.a.t")
+        async def rat(bot, trigger, match):
+            pass
+
+        for message, expected in [("rat", "rat"), ("RATS", "RATS"), ("a ratsignal", "ratsignal"),
+                                  ("r.a.t", "r.a.t"), ("ratsi", None), ("r-a-t", None)]:
+            with self.subTest(message=message):
+                hits = Keywords.scan(message)
+                self.assertEqual(expected, hits[0][1].group(0) if hits else None)
+
+    def test_once_per_pattern(self):
+        @Keywords.keyword("fuel")
+        async def fuel(bot, trigger, match):
+            pass
+
+        self.assertEqual(1, len(Keywords.scan("fuel fuel FUEL")))
+
+    def test_invalid_pattern(self):
+        with self.assertRaises(KeywordException):
+            @Keywords.keyword("(unbalanced", regex=True)
+            async def broken(bot, trigger, match):
+                pass
+
+    def test_numbered_backreference(self):
+        """
+        Verifies patterns referring to their own groups by number still match what they describe
+        next to other keywords
+        """
+        @Keywords.keyword("fuel")
+        async def fuel(bot, trigger, match):
+            pass
+
+        @Keywords.keyword(r"\b(\w)\1+\b", regex=True)
+        async def repeated(bot, trigger, match):
+            pass
+
+        hits = Keywords.scan("fuel please zzz")
+        self.assertEqual([("fuel", "fuel"), ("repeated", "zzz")],
+                         [(handler.__name__, match.group(0)) for handler, match in hits])
+        self.assertEqual(["fuel"], [handler.__name__ for handler, match in
+                                    Keywords.scan("need fuel, potato")])
+
+    def test_uncombinable_pattern(self):
+        """
+        Verifies a pattern that is valid on its own but can't be combined with the others is
+        rejected on registration, without affecting the keywords registered before
+        """
+        @Keywords.keyword(r"#(?P<case>\d+)", regex=True)
+        async def case_reference(bot, trigger, match):
+            pass
+
+        with self.assertRaises(KeywordException):
+            @Keywords.keyword("fuel", r"case (?P<case>\d+)", regex=True)
+            async def other_case(bot, trigger, match):
+                pass
+
+        self.assertEqual(["case_reference"], [handler.__name__ for handler, match in
+                                              Keywords.scan("fuel for case #3")])
+
+    def test_register_non_callable(self):
+        for item in [12, None, "str"]:
+            with self.subTest(item=item):
+                self.assertFalse(Keywords._register(item, ["foo"]))
+
+    @async_test
+    async def test_trigger(self):
+        @Keywords.keyword("ratsignal")
+        async def signal(bot, trigger, match):
+            await trigger.reply(f"{match.group(0)} from {trigger.nickname}")
+
+        @Keywords.keyword("ratsignal")
+        async def broken(bot, trigger, match):
+            raise RuntimeError("oops")
+
+        results = await Keywords.trigger("Ratsignal please", "unit_test", "#fuelrats")
+        self.assertEqual(2, len(results))
+        self.assertIn({"target": "#fuelrats", "message": "Ratsignal from unit_test"},
+                      self.bot.sent_messages)
@@ -0,0 +1,58 @@
+"""
+test_metrics.py
+
+Tests for the metrics module
+
+Copyright (c) 2018 The Fuel Rats Mischief,
+All rights reserved.
+
+Licensed under the BSD 3-Clause License.
+
+See LICENSE.md
+
+This module is built on top of the Pydle system.
+
+"""
+import unittest
+from unittest import mock
+
+from Modules.metrics import Metrics
+
+
+class MetricsTests(unittest.TestCase):
+    def setUp(self):
+        Metrics._flush()
+
+    def test_counter(self):
+        self.assertEqual(0, Metrics.count("potato"))
+        Metrics.increment("potato")
+        Metrics.increment("potato", 2)
+        self.assertEqual(3, Metrics.count("potato"))
+
+    def test_percentiles(self):
+        for value in range(1, 101):
+            Metrics.observe("latency", value)
+        self.assertEqual({50: 50, 90: 90, 99: 99}, Metrics.percentiles("latency"))
+        self.assertEqual({100: 100}, Metrics.percentiles("latency", 100))
+
+    def test_percentiles_empty(self):
+        self.assertEqual({}, Metrics.percentiles("nothing"))
+
+    @mock.patch("config.Metrics.samples", 10)
+    def test_samples_bounded(self):
+        for value in range(25):
+            Metrics.observe("bounded", value)
+        self.assertEqual(list(range(15, 25)), Metrics.samples("bounded"))
+
+    def test_timer_records_on_error(self):
+        with self.assertRaises(ValueError):
+            with Metrics.timer("failing"):
+                raise ValueError()
+        self.assertEqual(1, len(Metrics.samples("failing")))
+
+    def test_summary(self):
+        Metrics.increment("calls")
+        Metrics.observe("latency", 1.0)
+        self.assertEqual({"counters": {"calls": 1},
+                          "timings": {"latency": {50: 1.0, 90: 1.0, 99: 1.0}}},
+                         Metrics.summary())
@@ -104,6 +104,14 @@ class PermissionTests(unittest.TestCase):
             "message": "Restricted command was executed."
         }, self.bot.sent_messages)
 
+    @async_test
+    async def test_restricted_command_nickname_case(self):
+        await Commands.trigger("!restricted", "Some_OV", "#somechannel")
+        self.assertIn({
+            "target": "#somechannel",
+            "message": "Restricted command was executed."
+        }, self.bot.sent_messages)
+
     @async_test
     async def test_restricted_command_superior(self):
         await Commands.trigger("!restricted", "some_admin", "#somechannel")
@@ -14,6 +14,7 @@ This module is built on top of the Pydle system.
 
 """
 
+import asyncio
 import unittest
 from unittest import mock
 
@@ -22,7 +23,9 @@ from aiounittest import async_test
 
 from Modules.rat_command import Commands, CommandNotFoundException, NameCollisionException, InvalidCommandException, \
     CommandException
+from Modules.metrics import Metrics
 from tests.mock_bot import MockBot
+import config
 
 
 class RatCommandTests(unittest.TestCase):
@@ -183,3 +186,87 @@ class RatCommandTests(unittest.TestCase):
         for item in foo:
             with self.subTest(item=item):
                 self.assertFalse(Commands._register(item, ['foo']))
+
+    @async_test
+    async def test_replies_coalesced(self):
+        """
+        Verifies that several short replies of one command invocation are sent as a single line
+        """
+        @Commands.command("board")
+        async def board(bot, trigger):
+            for case in range(3):
+                await trigger.reply(f"case {case}")
+
+        Commands.bot.sent_messages.clear()
+        await Commands.trigger(message="!board", sender="unit_test", channel="#unit_testing")
+        self.assertEqual([{"target": "#unit_testing", "message": "case 0 | case 1 | case 2"}],
+                         Commands.bot.sent_messages)
+
+    @async_test
+    async def test_command_timeout(self):
+        """
+        Verifies a command exceeding its timeout is cancelled, cleaned up, reported and counted
+        """
+        cleaned_up = []
+
+        @Commands.command("hang", timeout=0.01)
+        async def hang(bot, trigger):
+            await trigger.reply("working on it")
+            try:
+                await asyncio.sleep(10)
+            finally:
+                cleaned_up.append(True)
+
+        Metrics._flush()
+        Commands.bot.sent_messages.clear()
+        self.assertIsNone(await Commands.trigger(message="!hang", sender="unit_test",
+                                                 channel="#unit_testing"))
+        self.assertEqual([True], cleaned_up)
+        self.assertEqual(1, Metrics.count("commands.timeout"))
+        self.assertEqual(1, Metrics.count("command.hang.timeout"))
+        self.assertEqual([{"target": "#unit_testing",
+                           "message": f"working on it | {config.Commands.timeout_message}"}],
+                         Commands.bot.sent_messages)
+
+    @async_test
+    async def test_command_timeout_default(self):
+        """
+        Verifies commands without an explicit timeout use the configured default
+        """
+        @Commands.command("hang")
+        async def hang(bot, trigger):
+            await asyncio.sleep(10)
+
+        Metrics._flush()
+        with mock.patch("config.Commands.timeout", 0.01):
+            await Commands.trigger(message="!hang", sender="unit_test", channel="#unit_testing")
+        self.assertEqual(1, Metrics.count("commands.timeout"))
+
+    @async_test
+    async def test_command_own_timeout(self):
+        """
+        Verifies a timeout raised by the command itself is its error, not a deadline hit
+        """
+        @Commands.command("lookup", timeout=1)
+        async def lookup(bot, trigger):
+            await asyncio.wait_for(asyncio.sleep(10), 0.01)
+
+        Metrics._flush()
+        Commands.bot.sent_messages.clear()
+        with self.assertRaises(asyncio.TimeoutError):
+            await Commands.trigger(message="!lookup", sender="unit_test", channel="#unit_testing")
+        self.assertEqual(0, Metrics.count("commands.timeout"))
+        self.assertEqual([], Commands.bot.sent_messages)
+
+    @async_test
+    async def test_command_within_timeout(self):
+        @Commands.command("quick", timeout=1)
+        async def quick(bot, trigger):
+            await asyncio.sleep(0)
+            return "done"
+
+        Metrics._flush()
+        self.assertEqual("done", await Commands.trigger(message="!quick", sender="unit_test",
+                                                        channel="#unit_testing"))
+        self.assertEqual(0, Metrics.count("commands.timeout"))
+        self.assertEqual(1, len(Metrics.samples("command.quick")))
@@ -0,0 +1,123 @@
+"""
+test_reply_buffer.py
+
+Tests for the reply_buffer module
+
+Copyright (c) 2018 The Fuel Rats Mischief,
+All rights reserved.
+
+Licensed under the BSD 3-Clause License.
+
+See LICENSE.md
+
+This module is built on top of the Pydle system.
+
+"""
+import unittest
+from unittest import mock
+
+from aiounittest import async_test
+
+from Modules.reply_buffer import ReplyBuffer, split_message, line_overhead
+from tests.mock_bot import MockBot
+
+
+class SplitMessageTests(unittest.TestCase):
+    def test_short_message(self):
+        self.assertEqual(["Hello there"], split_message("Hello there", 100))
+
+    def test_newlines(self):
+        self.assertEqual(["one", "two"], split_message("one\r\ntwo\n", 100))
+        self.assertEqual(["one", "two"], split_message("one\n\n \ntwo", 100))
+        self.assertEqual([], split_message("\n", 100))
+
+    def test_word_boundary(self):
+        self.assertEqual(["alpha beta", "gamma"], split_message("alpha beta gamma", 12))
+
+    def test_long_word(self):
+        self.assertEqual(["abcde", "fghij", "k"], split_message("abcdefghijk", 5))
+
+    def test_multibyte(self):
+        """
+        Verifies lines are limited by encoded size and never cut through a character
+        """
+        message = "ü" * 10  # two bytes each
+        lines = split_message(message, 5)
+        self.assertEqual("".join(lines), message)
+        for line in lines:
+            with self.subTest(line=line):
+                self.assertLessEqual(len(line.encode("utf-8")), 5)
+
+    def test_mixed_multibyte_words(self):
+        message = " ".join(["rätte"] * 50)
+        lines = split_message(message, 40)
+        self.assertEqual(message, " ".join(lines))
+        for line in lines:
+            with self.subTest(line=line):
+                self.assertLessEqual(len(line.encode("utf-8")), 40)
+
+    def test_tiny_limit(self):
+        with self.assertRaises(ValueError):
+            split_message("foo", 3)
+
+
+class ReplyBufferTests(unittest.TestCase):
+    def setUp(self):
+        self.bot = MockBot()
+
+    @async_test
+    async def test_coalesce_short_replies(self):
+        buffer = ReplyBuffer(self.bot, "#ratchat")
+        for reply in ["first", "second", "third"]:
+            buffer.add(reply)
+
+        self.assertEqual(1, await buffer.flush())
+        self.assertEqual([{"target": "#ratchat", "message": "first | second | third"}],
+                         self.bot.sent_messages)
+
+    @async_test
+    async def test_explicit_newlines_kept(self):
+        buffer = ReplyBuffer(self.bot, "#ratchat")
+        buffer.add("one\ntwo")
+        buffer.add("three")
+
+        await buffer.flush()
+        self.assertEqual(["one", "two | three"],
+                         [sent["message"] for sent in self.bot.sent_messages])
+
+    @async_test
+    async def test_lines_fit_protocol_limit(self):
+        buffer = ReplyBuffer(self.bot, "#ratchat")
+        for index in range(100):
+            buffer.add(f"Case #{index} CMDR client{index} (PC)")
+
+        await buffer.flush()
+        limit = 512 - line_overhead(self.bot, "#ratchat")
+        self.assertLess(len(self.bot.sent_messages), 100)
+        for sent in self.bot.sent_messages:
+            with self.subTest(message=sent["message"]):
+                self.assertLessEqual(len(sent["message"].encode("utf-8")), limit)
+
+    @mock.patch("config.IRC.line_length", 200)
+    def test_overhead_accounted(self):
+        buffer = ReplyBuffer(self.bot, "#ratchat")
+        buffer.add("x" * 100)
+        limit = 200 - line_overhead(self.bot, "#ratchat")
+        self.assertEqual(["x" * limit, "x" * (100 - limit)], buffer.lines())
+
+    @async_test
+    async def test_flush_empty(self):
+        buffer = ReplyBuffer(self.bot, "#ratchat")
+        self.assertEqual(0, await buffer.flush())
+        self.assertEqual([], self.bot.sent_messages)
+
+    @async_test
+    async def test_blank_lines_not_sent(self):
+        buffer = ReplyBuffer(self.bot, "#ratchat")
+        buffer.add("one\n\ntwo\n")
+        buffer.add("")
+        buffer.add("three")
+
+        self.assertEqual(2, await buffer.flush())
+        self.assertEqual(["one", "two | three"],
+                         [sent["message"] for sent in self.bot.sent_messages])
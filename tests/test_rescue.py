@@ -0,0 +1,102 @@
+"""
+test_rescue.py
+
+Tests for the rescue module
+
+Copyright (c) 2018 The Fuel Rats Mischief,
+All rights reserved.
+
+Licensed under the BSD 3-Clause License.
+
+See LICENSE.md
+
+This module is built on top of the Pydle system.
+
+"""
+import unittest
+
+from Modules.rescue import Rescue, RescueBoard
+
+
+class RescueTests(unittest.TestCase):
+    def test_new_rescue_fully_dirty(self):
+        rescue = Rescue("Client[PC]", system="Sol")
+        self.assertEqual(set(Rescue.fields), rescue.dirty)
+
+    def test_change_tracking(self):
+        rescue = Rescue("client", system="Sol", version=3)
+        self.assertEqual(set(), rescue.dirty)
+
+        rescue.system = "Sol"
+        self.assertEqual(set(), rescue.dirty)
+        rescue.system = "Fuelum"
+        rescue.rats = ("some_rat",)
+        self.assertEqual({"uuid": rescue.uuid, "version": 3,
+                          "fields": {"system": "Fuelum", "rats": ("some_rat",)}}, rescue.delta())
+
+    def test_apply_not_dirty(self):
+        rescue = Rescue("client", version=1)
+        rescue.system = "Sol"
+        rescue.apply({"system": "Fuelum", "rats": ["some_rat"], "potato": 1}, 2)
+        self.assertEqual(("Fuelum", ("some_rat",), 2), (rescue.system, rescue.rats, rescue.version))
+        self.assertEqual(set(), rescue.dirty)
+
+
+class RescueBoardTests(unittest.TestCase):
+    def setUp(self):
+        self.board = RescueBoard()
+        self.rescue = self.board.add(Rescue("Client[PC]", board_index=0, version=1))
+
+    def test_lookups(self):
+        self.assertEqual(0, self.rescue.board_index)
+        self.assertIs(self.rescue, self.board.by_index(0))
+        self.assertIs(self.rescue, self.board.by_uuid(self.rescue.uuid))
+        self.assertIs(self.rescue, self.board.by_client("client{pc}"))
+        self.assertIsNone(self.board.by_client("someone_else"))
+
+    def test_free_index(self):
+        second = self.board.add(Rescue("second"))
+        self.board.remove(self.rescue)
+        self.assertEqual(1, second.board_index)
+        self.assertEqual(0, self.board.add(Rescue("third")).board_index)
+
+    def test_indexes_follow_changes(self):
+        self.rescue.client = "Client[XB]"
+        self.rescue.board_index = 5
+        self.assertIsNone(self.board.by_client("client[pc]"))
+        self.assertIsNone(self.board.by_index(0))
+        self.assertIs(self.rescue, self.board.by_client("client[xb]"))
+        self.assertIs(self.rescue, self.board.by_index(5))
+
+        self.rescue.apply({"client": "Client[PS]", "board_index": 2}, 2)
+        self.assertIs(self.rescue, self.board.by_client("client[ps]"))
+        self.assertIs(self.rescue, self.board.by_index(2))
+        self.assertIsNone(self.board.by_index(5))
+
+    def test_index_collision(self):
+        """
+        Verifies a rescue arriving with, or changed to, a board index that is taken gets a free one
+        """
+        remote = Rescue("remote_client", version=1)
+        remote.apply({"board_index": 0}, 1)
+        self.board.add(remote)
+        self.assertIs(self.rescue, self.board.by_index(0))
+        self.assertIs(remote, self.board.by_index(1))
+        self.assertEqual((1, {"board_index"}), (remote.board_index, remote.dirty))
+
+        remote.apply({"board_index": 0}, 2)
+        self.assertIs(self.rescue, self.board.by_index(0))
+        self.assertIs(remote, self.board.by_index(1))
+        self.assertEqual(1, remote.board_index)
+
+        self.board.add(Rescue("third", board_index=2))
+        self.rescue.board_index = 1
+        # back to the lowest free index, the one it just left
+        self.assertEqual(0, self.rescue.board_index)
+        self.assertIs(self.rescue, self.board.by_index(0))
+        self.assertIs(remote, self.board.by_index(1))
+
+    def test_dirty(self):
+        self.assertEqual([], self.board.dirty())
+        self.rescue.code_red = True
+        self.assertEqual([self.rescue], self.board.dirty())
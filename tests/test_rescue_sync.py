@@ -0,0 +1,146 @@
+"""
+test_rescue_sync.py
+
+Tests for the rescue_sync module
+
+Copyright (c) 2018 The Fuel Rats Mischief,
+All rights reserved.
+
+Licensed under the BSD 3-Clause License.
+
+See LICENSE.md
+
+This module is built on top of the Pydle system.
+
+"""
+import unittest
+
+from aiounittest import async_test
+
+from Modules.rescue import Rescue, RescueBoard
+from Modules.rescue_sync import RescueSync, SyncException
+
+
+class StubBackend(object):
+    """Minimal in-memory stand-in for the rescue API."""
+
+    def __init__(self):
+        # uuid -> (version, fields)
+        self.rescues = {}
+        # list of deltas in the order they were accepted, the cursor is an index into it
+        self.log = []
+        self.pushed = []
+        self.fail = False
+
+    def change(self, uuid: str, **fields):
+        """Simulate a change made by someone else."""
+        version, current = self.rescues.get(uuid, (0, {}))
+        current = dict(current, **fields)
+        self.rescues[uuid] = (version + 1, current)
+        self.log.append({"uuid": uuid, "version": version + 1, "fields": fields})
+
+    async def push(self, deltas):
+        if self.fail:
+            raise ConnectionError("backend down")
+        self.pushed.append(deltas)
+        results = []
+        for delta in deltas:
+            version, current = self.rescues.get(delta["uuid"], (0, {}))
+            if delta["version"] != version:
+                changed = {}
+                for entry in self.log:
+                    if entry["uuid"] == delta["uuid"] and entry["version"] > delta["version"]:
+                        changed.update(entry["fields"])
+                results.append({"uuid": delta["uuid"], "version": version, "fields": changed,
+                                "conflict": True})
+                continue
+            self.change(delta["uuid"], **delta["fields"])
+            results.append({"uuid": delta["uuid"], "version": version + 1})
+        return results
+
+    async def pull(self, cursor):
+        cursor = cursor or 0
+        return self.log[cursor:], len(self.log)
+
+
+class RescueSyncTests(unittest.TestCase):
+    def setUp(self):
+        self.board = RescueBoard()
+        self.backend = StubBackend()
+        self.sync = RescueSync(self.board, self.backend, batch_size=2)
+
+    @async_test
+    async def test_push_only_deltas(self):
+        rescue = self.board.add(Rescue("client", system="Sol"))
+        self.assertEqual(1, await self.sync.push())
+        self.assertEqual(1, rescue.version)
+        self.assertEqual(set(), rescue.dirty)
+
+        # several changes between pushes coalesce into one delta with just the changed fields
+        rescue.system = "Fuelum"
+        rescue.system = "Beagle Point"
+        rescue.code_red = True
+        self.assertEqual(1, await self.sync.push())
+        self.assertEqual({"system": "Beagle Point", "code_red": True},
+                         self.backend.pushed[-1][0]["fields"])
+        self.assertEqual(0, await self.sync.push())
+
+    @async_test
+    async def test_batches(self):
+        for index in range(5):
+            self.board.add(Rescue(f"client{index}"))
+        self.assertEqual(5, await self.sync.push())
+        self.assertEqual([2, 2, 1], [len(batch) for batch in self.backend.pushed])
+
+    @async_test
+    async def test_push_failure_keeps_changes(self):
+        rescue = self.board.add(Rescue("client"))
+        self.backend.fail = True
+        with self.assertRaises(SyncException):
+            await self.sync.push()
+        self.assertEqual(set(Rescue.fields), rescue.dirty)
+
+    @async_test
+    async def test_pull_applies_remote(self):
+        rescue = self.board.add(Rescue("client"))
+        await self.sync.push()
+
+        self.backend.change(rescue.uuid, system="Sol", client="Client[PC]")
+        self.backend.change("remote-uuid", client="other_client", board_index=4)
+        self.assertEqual(2, await self.sync.pull())
+
+        self.assertEqual(("Sol", 2), (rescue.system, rescue.version))
+        self.assertIs(rescue, self.board.by_client("client{pc}"))
+        remote = self.board.by_index(4)
+        self.assertEqual(("remote-uuid", "other_client", set()),
+                         (remote.uuid, remote.client, remote.dirty))
+        # nothing new since the cursor
+        self.assertEqual(0, await self.sync.pull())
+
+    def test_stale_remote_ignored(self):
+        rescue = self.board.add(Rescue("client", system="Fuelum", version=5))
+        self.assertEqual(0, self.sync.receive([{"uuid": rescue.uuid, "version": 4,
+                                                "fields": {"system": "Sol"}}]))
+        self.assertEqual("Fuelum", rescue.system)
+
+    @async_test
+    async def test_conflict(self):
+        """
+        Verifies the backend's newer values win and unrelated local changes are pushed again
+        """
+        rescue = self.board.add(Rescue("client", system="Sol"))
+        await self.sync.push()
+
+        self.backend.change(rescue.uuid, system="Fuelum")
+        rescue.system = "Beagle Point"
+        rescue.code_red = True
+        await self.sync.push()
+
+        self.assertEqual(("Fuelum", True, 2), (rescue.system, rescue.code_red, rescue.version))
+        self.assertEqual({"code_red"}, rescue.dirty)
+
+        await self.sync.sync()
+        self.assertEqual(set(), rescue.dirty)
+        self.assertEqual((3, {"client": "client", "system": "Fuelum", "active": True,
+                              "code_red": True, "platform": None, "rats": (), "board_index": 0}),
+                         self.backend.rescues[rescue.uuid])
@@ -0,0 +1,208 @@
+"""
+test_scheduler.py
+
+Tests for the scheduler module
+
+Copyright (c) 2018 The Fuel Rats Mischief,
+All rights reserved.
+
+Licensed under the BSD 3-Clause License.
+
+See LICENSE.md
+
+This module is built on top of the Pydle system.
+
+"""
+import asyncio
+import unittest
+
+from aiounittest import async_test
+
+from Modules.metrics import Metrics
+from Modules.scheduler import Lane, LaneScheduler, classify, current_job
+
+
+class ClassifyTests(unittest.TestCase):
+    def test_ratsignal(self):
+        for message in ["RATSIGNAL - CMDR potato - System: Sol", "ratsignal", "!ping RatSignal"]:
+            with self.subTest(message=message):
+                self.assertEqual(Lane.EMERGENCY, classify(message))
+
+    def test_dispatch_command(self):
+        for message in ["!assign 2 some_rat", "!GO 1 rat", "!clear 3"]:
+            with self.subTest(message=message):
+                self.assertEqual(Lane.DISPATCH, classify(message))
+
+    def test_normal(self):
+        for message in ["!ping", "!prep client", "hello there", "!", "assign 2 rat"]:
+            with self.subTest(message=message):
+                self.assertEqual(Lane.NORMAL, classify(message))
+
+
+class LaneSchedulerTests(unittest.TestCase):
+    def setUp(self):
+        Metrics._flush()
+
+    @async_test
+    async def test_result_and_exception(self):
+        scheduler = LaneScheduler("test")
+
+        async def double(value):
+            return value * 2
+
+        async def broken():
+            raise ValueError("nope")
+
+        try:
+            self.assertEqual(42, await scheduler.submit(Lane.NORMAL, double, 21))
+            with self.assertRaises(ValueError):
+                await scheduler.submit(Lane.NORMAL, broken)
+        finally:
+            await scheduler.stop()
+
+    @async_test
+    async def test_weighted_order(self):
+        """
+        Verifies lanes are served by weight without starving lower lanes
+        """
+        scheduler = LaneScheduler("test", weights=(2, 1, 1))
+        order = []
+
+        async def record(name):
+            order.append(name)
+
+        futures = [scheduler.submit(Lane.NORMAL, record, "normal") for _ in range(2)]
+        futures += [scheduler.submit(Lane.DISPATCH, record, "dispatch") for _ in range(2)]
+        futures += [scheduler.submit(Lane.EMERGENCY, record, "emergency") for _ in range(4)]
+        try:
+            await asyncio.gather(*futures)
+        finally:
+            await scheduler.stop()
+
+        self.assertEqual(["emergency", "emergency", "dispatch", "normal",
+                          "emergency", "emergency", "dispatch", "normal"], order)
+
+    @async_test
+    async def test_lane_carried_to_outbound(self):
+        """
+        Verifies work done for an inbound job can find the job (and thus its lane)
+        """
+        inbound = LaneScheduler("inbound")
+        outbound = LaneScheduler("outbound")
+        sent = []
+
+        async def send(message):
+            sent.append((current_job.get().lane, message))
+
+        async def handle(message):
+            job = current_job.get()
+            await outbound.submit(job.lane, send, message, _parent=job)
+
+        try:
+            await inbound.submit(Lane.EMERGENCY, handle, "RATSIGNAL")
+        finally:
+            await inbound.stop()
+            await outbound.stop()
+
+        self.assertEqual([(Lane.EMERGENCY, "RATSIGNAL")], sent)
+        self.assertEqual(1, len(Metrics.samples("outbound.latency.emergency")))
+
+    @async_test
+    async def test_ratsignal_under_load(self):
+        """
+        Verifies a ratsignal queued behind a dozen routine commands is handled first, and that its
+        signal-to-announcement latency is measured.
+        """
+        inbound = LaneScheduler("inbound", concurrency=2)
+        outbound = LaneScheduler("outbound")
+        handled = []
+
+        async def send(message):
+            await asyncio.sleep(0.001)
+
+        async def handle(message):
+            job = current_job.get()
+            handled.append(message)
+            await asyncio.sleep(0.005)
+            await outbound.submit(job.lane, send, message, _parent=job)
+
+        futures = [inbound.submit(Lane.NORMAL, handle, f"!ping {index}") for index in range(12)]
+        futures.append(inbound.submit(Lane.EMERGENCY, handle, "RATSIGNAL"))
+        try:
+            await asyncio.gather(*futures)
+        finally:
+            await inbound.stop()
+            await outbound.stop()
+
+        self.assertEqual("RATSIGNAL", handled[0])
+        ratsignal_latency = Metrics.samples("outbound.latency.emergency")
+        routine_latency = Metrics.samples("outbound.latency.normal")
+        self.assertEqual(1, len(ratsignal_latency))
+        self.assertLess(ratsignal_latency[0], max(routine_latency))
+
+    @async_test
+    async def test_job_cancelling_itself(self):
+        """
+        Verifies a job raising CancelledError on its own doesn't take its worker down with it
+        """
+        scheduler = LaneScheduler("test")
+
+        async def cancelled():
+            future = asyncio.get_event_loop().create_future()
+            future.cancel()
+            await future
+
+        async def double(value):
+            return value * 2
+
+        try:
+            with self.assertRaises(asyncio.CancelledError):
+                await scheduler.submit(Lane.NORMAL, cancelled)
+            self.assertEqual(42, await asyncio.wait_for(scheduler.submit(Lane.NORMAL, double, 21),
+                                                        1))
+        finally:
+            await scheduler.stop()
+
+    @async_test
+    async def test_slow_job_not_blocking(self):
+        """
+        Verifies a slow job doesn't hold up the next job in its lane
+        """
+        scheduler = LaneScheduler("test", concurrency=2)
+        finished = []
+
+        async def handle(message, delay):
+            await asyncio.sleep(delay)
+            finished.append(message)
+
+        slow = scheduler.submit(Lane.NORMAL, handle, "!prep client", 0.5)
+        try:
+            await asyncio.wait_for(scheduler.submit(Lane.NORMAL, handle, "!ping", 0), 0.1)
+            self.assertEqual(["!ping"], finished)
+        finally:
+            slow.cancel()
+            await scheduler.stop()
+
+    @async_test
+    async def test_order_by_key(self):
+        """
+        Verifies jobs sharing a key finish in the order they were submitted, even with spare
+        workers and earlier jobs taking longer, while other jobs pass them
+        """
+        scheduler = LaneScheduler("test", concurrency=3)
+        finished = []
+
+        async def handle(message, delay):
+            await asyncio.sleep(delay)
+            finished.append(message)
+
+        futures = [scheduler.submit(Lane.DISPATCH, handle, "!assign 1 rat", 0.03, _key="#fr"),
+                   scheduler.submit(Lane.DISPATCH, handle, "!go 1", 0.01, _key="#fr"),
+                   scheduler.submit(Lane.DISPATCH, handle, "!clear 2", 0.02, _key="#drill"),
+                   scheduler.submit(Lane.NORMAL, handle, "!ping", 0)]
+        try:
+            await asyncio.wait_for(asyncio.gather(*futures), 1)
+        finally:
+            await scheduler.stop()
+
+        self.assertEqual(["!ping", "!clear 2", "!assign 1 rat", "!go 1"], finished)
@@ -0,0 +1,107 @@
+"""
+test_snapshot.py
+
+Tests for the snapshot module
+
+Copyright (c) 2018 The Fuel Rats Mischief,
+All rights reserved.
+
+Licensed under the BSD 3-Clause License.
+
+See LICENSE.md
+
+This module is built on top of the Pydle system.
+
+"""
+import os
+import pickle
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from aiounittest import async_test
+
+from Modules import snapshot
+from Modules.history import History
+from Modules.rescue import Rescue, RescueBoard
+from Modules.user_index import UserIndex
+
+
+def make_bot(users: dict = None, channels: dict = None):
+    return SimpleNamespace(users=UserIndex(users or {}), channels=channels or {},
+                           board=RescueBoard(), history=History())
+
+
+class SnapshotTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "snapshot.pickle")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    @async_test
+    async def test_round_trip(self):
+        bot = make_bot(users={"Client[PC]": {"nickname": "Client[PC]", "username": "client",
+                                             "hostname": "client.example", "identified": True}},
+                       channels={"#fuelrats": {"users": {"Client[PC]"}, "topic": "rescues"},
+                                 "#ratchat": {"users": set(), "password": "hunter2"}})
+        synced = bot.board.add(Rescue("Client[PC]", system="Sol", board_index=0, version=3))
+        synced.code_red = True
+        bot.board.add(Rescue("other_client"))
+        bot.history.record("#fuelrats", "Client[PC]", "ratsignal", timestamp=10)
+
+        size = await snapshot.Snapshotter(bot, self.path).save()
+        self.assertEqual(size, os.path.getsize(self.path))
+        with open(self.path, "rb") as file:
+            self.assertNotIn(b"hunter2", file.read())
+        self.assertFalse(os.path.exists(f"{self.path}.tmp"))
+
+        warm = make_bot()
+        snapshot.restore(warm, snapshot.read(self.path))
+
+        rescue = warm.board.by_client("client{pc}")
+        self.assertEqual((synced.uuid, 3, "Sol", {"code_red"}),
+                         (rescue.uuid, rescue.version, rescue.system, rescue.dirty))
+        self.assertEqual(set(Rescue.fields), warm.board.by_client("other_client").dirty)
+        self.assertEqual("ratsignal", warm.history.last_from("client[pc]")[0].message)
+        self.assertEqual(["#fuelrats"], warm.warm_channels)
+        self.assertEqual("client.example", warm.warm_users["CLIENT{PC}"]["hostname"])
+        # the server's view is what counts, restoring doesn't touch it
+        self.assertEqual(0, len(warm.users))
+
+    def test_write_atomic(self):
+        snapshot.write(self.path, b"old")
+        with mock.patch("os.replace", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                snapshot.write(self.path, b"new")
+        with open(self.path, "rb") as file:
+            self.assertEqual(b"old", file.read())
+
+    def test_read_missing_or_stale(self):
+        self.assertIsNone(snapshot.read(self.path))
+        state = snapshot.loads(b"".join(snapshot.chunks(make_bot())))
+        state["time"] = time.time() - 120
+        snapshot.write(self.path, snapshot.dumps(state))
+        self.assertIsNone(snapshot.read(self.path, max_age=60))
+        self.assertEqual(state, snapshot.read(self.path, max_age=600))
+
+    def test_read_unusable(self):
+        for case, data in (("garbage", b"\x00not a pickle"),
+                           ("object", pickle.dumps(Rescue("client"))),
+                           ("format", pickle.dumps({"format": -1, "time": time.time(),
+                                                    "sections": []}))):
+            with self.subTest(case=case):
+                snapshot.write(self.path, data)
+                with self.assertRaises(snapshot.SnapshotException):
+                    snapshot.read(self.path)
+
+    def test_warm_user(self):
+        user = {"nickname": "client", "username": "fresh", "hostname": None, "realname": None,
+                "identified": False, "account": None}
+        snapshot.warm_user(user, {"username": "stale", "hostname": "client.example",
+                                  "identified": True, "account": "client"})
+        self.assertEqual({"nickname": "client", "username": "fresh", "hostname": "client.example",
+                          "realname": None, "identified": False, "account": None}, user)
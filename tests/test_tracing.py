@@ -0,0 +1,131 @@
+"""
+test_tracing.py
+
+Tests for the tracing module
+
+Copyright (c) 2018 The Fuel Rats Mischief,
+All rights reserved.
+
+Licensed under the BSD 3-Clause License.
+
+See LICENSE.md
+
+This module is built on top of the Pydle system.
+
+"""
+import asyncio
+import unittest
+
+from aiounittest import async_test
+
+from Modules import permissions, tracing
+from Modules.permissions import require_permission
+from Modules.rat_command import Commands
+from tests.mock_bot import MockBot
+
+
+class ListExporter(object):
+    def __init__(self):
+        self.records = []
+
+    def record(self, **fields):
+        self.records.append(fields)
+
+
+class TracingTests(unittest.TestCase):
+    def setUp(self):
+        Commands._flush()
+        Commands.bot = MockBot()
+        self.exporter = ListExporter()
+        tracing.tracer = tracing.Tracer(self.exporter, sample_rate=1.0)
+
+    def tearDown(self):
+        tracing.tracer = None
+
+    def names(self) -> list:
+        return [record["name"] for record in self.exporter.records]
+
+    def test_disabled(self):
+        tracing.tracer = None
+        with tracing.trace("trigger") as root, tracing.span("tokenize") as span:
+            self.assertIsNone(root)
+            self.assertIsNone(span)
+            self.assertIsNone(tracing.correlation_id())
+
+    @async_test
+    async def test_command_spans(self):
+        """
+        Verifies a traced command exports one span per step, all sharing the trigger's
+        correlation ID
+        """
+        seen = []
+
+        @Commands.command("assign")
+        @require_permission(permissions.OVERSEER)
+        async def assign(bot, trigger):
+            seen.append(trigger.correlation_id)
+            await trigger.reply("assigned")
+            await trigger.reply("done")
+
+        await Commands.trigger("!assign client", "some_ov", "#unit_test")
+
+        self.assertEqual(["trigger", "tokenize", "lookup", "command", "permission", "reply",
+                          "reply", "flush", "send"], self.names())
+        by_name = {record["name"]: record for record in self.exporter.records}
+        root = by_name["trigger"]
+        self.assertEqual(("assign", "some_ov", "#unit_test", None),
+                         (root["command"], root["sender"], root["channel"], root["parent"]))
+        self.assertEqual({seen[0]}, {record["trace"] for record in self.exporter.records})
+        self.assertEqual(by_name["command"]["span"], by_name["permission"]["parent"])
+        self.assertEqual(by_name["command"]["span"], by_name["reply"]["parent"])
+        self.assertEqual(by_name["flush"]["span"], by_name["send"]["parent"])
+        self.assertTrue(by_name["permission"]["granted"])
+        for record in self.exporter.records:
+            self.assertGreaterEqual(root["duration"], record["duration"])
+
+    @async_test
+    async def test_error_recorded(self):
+        @Commands.command("broken")
+        async def broken(bot, trigger):
+            raise RuntimeError("oops")
+
+        with self.assertRaises(RuntimeError):
+            await Commands.trigger("!broken", "some_ov", "#unit_test")
+        by_name = {record["name"]: record for record in self.exporter.records}
+        self.assertIn("RuntimeError", by_name["command"]["error"])
+        self.assertIn("RuntimeError", by_name["trigger"]["error"])
+
+    @async_test
+    async def test_sampling(self):
+        @Commands.command("ping")
+        async def ping(bot, trigger):
+            await asyncio.sleep(0.02)
+
+        with self.subTest(case="unsampled, fast"):
+            tracing.tracer = tracing.Tracer(self.exporter, sample_rate=0.0, slow_threshold=10)
+            await Commands.trigger("!ping", "some_ov", "#unit_test")
+            self.assertEqual([], self.exporter.records)
+
+        with self.subTest(case="unsampled, slow"):
+            tracing.tracer = tracing.Tracer(self.exporter, sample_rate=0.0, slow_threshold=0.01)
+            await Commands.trigger("!ping", "some_ov", "#unit_test")
+            self.assertEqual(["trigger", "tokenize", "lookup", "command", "flush"], self.names())
+
+    def test_unsampled_not_recorded(self):
+        """
+        Verifies unsampled traces don't record spans unless a slow threshold asks for them
+        """
+        tracing.tracer = tracing.Tracer(self.exporter, sample_rate=0.0)
+        with tracing.trace("trigger") as root, tracing.span("tokenize") as span:
+            self.assertIsNone(root)
+            self.assertIsNone(span)
+        self.assertEqual([], self.exporter.records)
+
+    def test_correlation_id_scoped(self):
+        with tracing.trace("outer") as outer:
+            outer_id = tracing.correlation_id()
+            with tracing.span("inner"):
+                self.assertEqual(outer_id, tracing.correlation_id())
+            self.assertIs(outer, tracing.current_span.get())
+        self.assertIsNone(tracing.correlation_id())
+        self.assertEqual(outer_id, outer.trace.correlation_id)
@@ -30,6 +30,14 @@ class TriggerTests(unittest.TestCase):
         self.assertEqual(trigger.account, self.bot.users["unit_test"]["account"])
         self.assertEqual(trigger.identified, self.bot.users["unit_test"]["identified"])
 
+    def test_create_from_user_casemapping(self):
+        """
+        Verifies users are found regardless of how the nickname is cased under rfc1459 rules
+        """
+        trigger = Trigger.from_bot_user(self.bot, "UNIT_TEST{bot}", "#somechannel")
+        self.assertEqual("unit_test[BOT]", trigger.nickname)
+        self.assertEqual(self.bot.users["unit_test[BOT]"]["hostname"], trigger.hostname)
+
     def test_create_from_user_query(self):
         trigger = Trigger.from_bot_user(self.bot, "unit_test[BOT]", "not_a_channel")
         self.assertIsNone(trigger.channel)
@@ -0,0 +1,97 @@
+"""
+test_user_index.py
+
+Tests for the user_index module
+
+Copyright (c) 2018 The Fuel Rats Mischief,
+All rights reserved.
+
+Licensed under the BSD 3-Clause License.
+
+See LICENSE.md
+
+This module is built on top of the Pydle system.
+
+"""
+import unittest
+
+from Modules.user_index import UserIndex, casefold, rename_case_only, supported_case_mapping
+
+
+class CasefoldTests(unittest.TestCase):
+    def test_rfc1459(self):
+        self.assertEqual("client{pc}|^", casefold("Client[PC]\\~"))
+
+    def test_strict_rfc1459(self):
+        self.assertEqual("client{pc}|~", casefold("Client[PC]\\~", "strict-rfc1459"))
+
+    def test_ascii(self):
+        self.assertEqual("client[pc]\\~", casefold("Client[PC]\\~", "ascii"))
+
+    def test_supported_case_mapping(self):
+        for advertised, expected in [("ascii", "ascii"), ("strict-rfc1459", "strict-rfc1459"),
+                                     ("rfc7613", "rfc1459"), (None, "rfc1459")]:
+            with self.subTest(advertised=advertised):
+                self.assertEqual(expected, supported_case_mapping(advertised))
+
+
+class UserIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.user = {"nickname": "Client[PC]"}
+        self.index = UserIndex({"Client[PC]": self.user})
+
+    def test_lookup(self):
+        for nickname in ["Client[PC]", "client{pc}", "CLIENT[pc]"]:
+            with self.subTest(nickname=nickname):
+                self.assertIn(nickname, self.index)
+                self.assertIs(self.user, self.index[nickname])
+        self.assertNotIn("client", self.index)
+        self.assertNotIn(None, self.index)
+
+    def test_iteration_keeps_spelling(self):
+        self.assertEqual(["Client[PC]"], list(self.index))
+        self.assertEqual("Client[PC]", self.index.nickname("client{pc}"))
+
+    def test_delete(self):
+        del self.index["CLIENT{PC}"]
+        self.assertEqual(0, len(self.index))
+        with self.assertRaises(KeyError):
+            self.index["Client[PC]"]
+
+    def test_rename(self):
+        self.index.rename("client{pc}", "Client[XB]")
+        self.assertNotIn("Client[PC]", self.index)
+        self.assertIs(self.user, self.index["client{xb}"])
+
+    def test_rename_case_only(self):
+        self.index.rename("Client[PC]", "client{pc}")
+        self.assertEqual(["client{pc}"], list(self.index))
+
+    def test_other_case_mapping(self):
+        ascii_index = UserIndex(self.index, case_mapping="ascii")
+        self.assertIn("client[pc]", ascii_index)
+        self.assertNotIn("client{pc}", ascii_index)
+
+    def test_rename_case_only_in_channels(self):
+        """
+        Verifies a case-only nick change moves the user and updates channel members and modes
+        """
+        channels = {"#fuelrats": {"users": {"Client[PC]", "some_ov"},
+                                  "modes": {"v": ["Client[PC]"], "o": ["some_ov"]}}}
+        self.assertTrue(rename_case_only(self.index, channels, "Client[PC]", "client{pc}",
+                                         ("v", "o")))
+        self.assertEqual(["client{pc}"], list(self.index))
+        self.assertEqual("client{pc}", self.user["nickname"])
+        self.assertEqual({"client{pc}", "some_ov"}, channels["#fuelrats"]["users"])
+        self.assertEqual({"v": ["client{pc}"], "o": ["some_ov"]}, channels["#fuelrats"]["modes"])
+
+    def test_rename_case_only_ignores_other_changes(self):
+        channels = {"#fuelrats": {"users": {"Client[PC]"}, "modes": {}}}
+        self.assertFalse(rename_case_only(self.index, channels, "Client[PC]", "Client[XB]"))
+        self.assertFalse(rename_case_only(self.index, channels, "nobody", "NOBODY"))
+        self.assertEqual(["Client[PC]"], list(self.index))
+        self.assertEqual({"Client[PC]"}, channels["#fuelrats"]["users"])
+
+    def test_unknown_case_mapping(self):
+        with self.assertRaises(ValueError):
+            UserIndex(case_mapping="potato")
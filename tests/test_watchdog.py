@@ -0,0 +1,95 @@
+"""
+test_watchdog.py
+
+Tests for the watchdog module
+
+Copyright (c) 2018 The Fuel Rats Mischief,
+All rights reserved.
+
+Licensed under the BSD 3-Clause License.
+
+See LICENSE.md
+
+This module is built on top of the Pydle system.
+
+"""
+import asyncio
+import time
+import unittest
+from unittest import mock
+
+from aiounittest import async_test
+
+from Modules.metrics import Metrics
+from Modules.rat_command import Commands
+from Modules.watchdog import Watchdog
+from tests.mock_bot import MockBot
+
+
+class WatchdogTests(unittest.TestCase):
+    def setUp(self):
+        Metrics._flush()
+        Watchdog._recent.clear()
+
+    def test_activity_tracking(self):
+        with Watchdog.activity("command.potato"):
+            self.assertEqual(["command.potato"], Watchdog.running())
+        self.assertEqual([], Watchdog.running())
+
+    def test_culprits(self):
+        with Watchdog.activity("old"):
+            pass
+        since = time.perf_counter()
+        with Watchdog.activity("recent"):
+            pass
+        with Watchdog.activity("running"):
+            self.assertEqual(["running", "recent"], Watchdog.culprits(since))
+
+    @mock.patch("config.Watchdog.threshold", 0.05)
+    def test_check(self):
+        since = time.perf_counter()
+        with Watchdog.activity("command.slow"):
+            Watchdog.check(0.01, since)
+            Watchdog.check(0.2, since)
+
+        self.assertEqual(2, len(Metrics.samples("loop.lag")))
+        self.assertEqual(1, Metrics.count("loop.stalls"))
+        self.assertEqual(1, Metrics.count("loop.stalls.command.slow"))
+
+    @async_test
+    async def test_blocking_command_blamed(self):
+        """
+        Verifies a command blocking the loop shows up as a stall and slow callback attributed to it
+        """
+        Commands._flush()
+        Commands.bot = MockBot()
+
+        @Commands.command("block")
+        async def block(bot, trigger):
+            await asyncio.sleep(0.02)
+            time.sleep(0.1)
+
+        @Commands.command("idle")
+        async def idle(bot, trigger):
+            await asyncio.sleep(0.2)
+
+        with mock.patch("config.Watchdog.slow_callbacks", True), \
+                mock.patch("config.Watchdog.threshold", 0.02), \
+                mock.patch("config.Watchdog.interval", 0.01):
+            Watchdog.start()
+            try:
+                waiting = asyncio.ensure_future(
+                    Commands.trigger(message="!idle", sender="unit_test", channel="#unit_testing"))
+                await Commands.trigger(message="!block", sender="unit_test",
+                                       channel="#unit_testing")
+                await asyncio.sleep(0.05)
+                await waiting
+            finally:
+                await Watchdog.stop()
+                asyncio.get_event_loop().set_debug(False)
+
+        self.assertGreaterEqual(Metrics.count("loop.stalls.command.block"), 1)
+        self.assertGreaterEqual(Metrics.count("loop.slow_callbacks.command.block"), 1)
+        # suspended the whole time, so not to blame for slow callbacks
+        self.assertEqual(0, Metrics.count("loop.slow_callbacks.command.idle"))
+        self.assertGreaterEqual(Watchdog.lag_percentiles()[99], 0.05)